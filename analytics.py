@@ -0,0 +1,236 @@
+import threading
+import time
+import logging
+import datetime
+import email.utils
+from collections import Counter
+from logsetup import SAMPLED
+
+# Seconds between full reconciliations against GET /orders, which pick up orders
+# placed or deleted outside the bot.
+RECONCILE_INTERVAL = 3600.0
+# Rows shown per section of the stats message.
+TOP_N = 10
+# Days of daily totals shown.
+DAYS_SHOWN = 7
+
+
+def parse_order_date(value):
+    """
+    Parses an order date in the formats the backend may send: ISO 8601 ('2026-01-01',
+    '2026-01-01T10:00:00Z'), RFC 2822 as Flask serialises datetimes ('Wed, 01 Jan 2026
+    10:00:00 GMT') or a Unix timestamp. The calendar day is kept as written, without
+    converting between time zones.
+    :return: A date, or None if the value is not recognised.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date()
+        except (OverflowError, OSError, ValueError):
+            return None
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.strip()).date()
+    except ValueError:
+        pass
+    try:
+        return email.utils.parsedate_to_datetime(value).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def order_day(order):
+    """
+    :return: The YYYY-MM-DD day of an order, today if the backend did not report a
+             date or sent one that cannot be parsed.
+    """
+    date = order.get("order_date")
+    day = parse_order_date(date) if date not in (None, "") else None
+    if day is None:
+        if date not in (None, ""):
+            logging.warning(f"Unrecognised order_date {date!r} on order {order.get('id')}, counting it as today",
+                            extra=SAMPLED)
+        day = datetime.date.today()
+    return day.isoformat()
+
+
+class OrderAnalytics:
+    """
+    Sales aggregates kept in memory: units sold per product, orders per user, and
+    orders and units per day. Seeded once from the full order list, then updated
+    incrementally as the bot's own orders are placed and deleted, so answering never
+    re-downloads the order history. A periodic reconciliation replaces the aggregates
+    with a fresh count to pick up changes made through other clients.
+    :param fetch: Callable returning the full order list, or None if the backend failed.
+    :param reconcile_interval: Seconds between reconciliations.
+    """
+
+    def __init__(self, fetch, reconcile_interval=RECONCILE_INTERVAL):
+        self.fetch = fetch
+        self.reconcile_interval = reconcile_interval
+        self._orders = {}
+        self._units = Counter()
+        self._user_orders = Counter()
+        self._day_orders = Counter()
+        self._day_units = Counter()
+        self._seeded_at = None
+        # Set while a seed is in progress; callers that arrive meanwhile wait for it.
+        self._seeding = None
+        self._events = []
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self.reconciliations = 0
+
+    def is_seeded(self):
+        return self._seeded_at is not None
+
+    def seed(self):
+        """
+        Rebuilds the aggregates from the full order list. Orders placed or deleted while
+        the list was being fetched are replayed on top of it. Only one thread fetches;
+        the others wait for its result.
+        :return: True if the aggregates are available.
+        """
+        with self._lock:
+            seeding = self._seeding
+            if seeding is None:
+                seeding = self._seeding = threading.Event()
+                self._events = []
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            seeding.wait()
+            return self.is_seeded()
+
+        try:
+            try:
+                orders = self.fetch()
+            except Exception as e:
+                logging.error(f"Error fetching orders for analytics: {e}")
+                orders = None
+            with self._lock:
+                self._seeding = None
+                events, self._events = self._events, []
+                if orders is None:
+                    return self._seeded_at is not None
+                self._orders = {}
+                self._units.clear()
+                self._user_orders.clear()
+                self._day_orders.clear()
+                self._day_units.clear()
+                for order in orders:
+                    self._add(order)
+                for placed, order in events:
+                    if placed:
+                        self._add(order)
+                    else:
+                        self._remove(order)
+                self._seeded_at = time.monotonic()
+                self.reconciliations += 1
+        finally:
+            seeding.set()
+        self._start_reconciler()
+        return True
+
+    def _add(self, order):
+        # Called with the lock held. Orders already counted (by id) are skipped.
+        key = order.get("id")
+        if key is not None:
+            if key in self._orders:
+                return
+            self._orders[key] = order
+        quantity = int(order.get("quantity") or 0)
+        day = order_day(order)
+        self._units[order.get("product_id")] += quantity
+        if order.get("user_id") is not None:
+            self._user_orders[order["user_id"]] += 1
+        self._day_orders[day] += 1
+        self._day_units[day] += quantity
+
+    def _remove(self, order_id):
+        # Called with the lock held.
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return
+        quantity = int(order.get("quantity") or 0)
+        day = order_day(order)
+        for counter, key, amount in ((self._units, order.get("product_id"), quantity),
+                                     (self._user_orders, order.get("user_id"), 1),
+                                     (self._day_orders, day, 1),
+                                     (self._day_units, day, quantity)):
+            if key not in counter:
+                continue
+            counter[key] -= amount
+            if counter[key] <= 0:
+                del counter[key]
+
+    def order_placed(self, order):
+        """
+        Counts an order the backend accepted.
+        """
+        with self._lock:
+            if self._seeding is not None:
+                self._events.append((True, order))
+            if self._seeded_at is not None:
+                self._add(order)
+
+    def order_deleted(self, order_id):
+        with self._lock:
+            if self._seeding is not None:
+                self._events.append((False, order_id))
+            if self._seeded_at is not None:
+                self._remove(order_id)
+
+    def request_reconcile(self):
+        """
+        Asks the reconciler to re-count soon, e.g. after a bulk import bypassed the bot's handlers.
+        """
+        if self._thread is not None:
+            self._wakeup.set()
+
+    def _start_reconciler(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="analytics-reconciler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.reconcile_interval)
+            self._wakeup.clear()
+            self.seed()
+
+    def snapshot(self, top=TOP_N, days=DAYS_SHOWN):
+        """
+        :return: Dictionary with the top products by units, the top users by orders and
+                 the most recent daily totals, or None if the aggregates were never seeded.
+        """
+        with self._lock:
+            if self._seeded_at is None:
+                return None
+            recent_days = sorted(self._day_orders, reverse=True)[:days]
+            return {
+                "orders": sum(self._day_orders.values()),
+                "units": sum(self._units.values()),
+                "products": len(self._units),
+                "users": len(self._user_orders),
+                "top_products": self._units.most_common(top),
+                "top_users": self._user_orders.most_common(top),
+                "days": [(day, self._day_orders[day], self._day_units[day]) for day in recent_days],
+                "age": time.monotonic() - self._seeded_at,
+            }
+
+    def stats(self):
+        with self._lock:
+            return {"orders": len(self._orders), "products": len(self._units), "reconciliations": self.reconciliations}
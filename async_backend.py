@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+import aiohttp
+from backend import (
+    BOT_WORKERS, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, IDEMPOTENT_METHODS,
+    backend_failures, backend_seconds, endpoint_group, endpoint_label, make_breakers,
+)
+
+
+class AsyncResponse:
+    """
+    Minimal response object exposing the parts of requests.Response the handlers use.
+    """
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncBackendClient:
+    """
+    asyncio counterpart of backend.BackendClient, backed by a pooled aiohttp session.
+    :param base_url: Base URL of the backend; request paths are appended to it.
+    :param pool_size: Maximum number of concurrent connections to the backend host.
+    """
+
+    def __init__(self, base_url, pool_size=BOT_WORKERS, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._session = None
+        self.breakers = make_breakers()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._errors = 0
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def request(self, method, path, **kwargs):
+        """
+        Sends a request to the backend. Only idempotent verbs are retried once the
+        request may have reached the server.
+        :return: AsyncResponse with the status code and the full body.
+        :raises backend.CircuitOpenError: If the endpoint group's breaker is open.
+        """
+        breaker = self.breakers.get(endpoint_group(path))
+        if breaker is not None:
+            breaker.before_request()
+        retryable = method in IDEMPOTENT_METHODS
+        self._in_flight += 1
+        self._requests += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        endpoint = endpoint_label(path)
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    async with self._get_session().request(method, f"{self.base_url}{path}", **kwargs) as response:
+                        content = await response.read()
+                        if retryable and not last_attempt and response.status in (502, 503, 504):
+                            await asyncio.sleep(self.backoff * 2 ** attempt)
+                            continue
+                        if response.status >= 500:
+                            backend_failures.inc(method=method, endpoint=endpoint)
+                            if breaker is not None:
+                                breaker.record_failure()
+                        elif breaker is not None:
+                            breaker.record_success()
+                        return AsyncResponse(response.status, content)
+                except aiohttp.ClientConnectorError:
+                    # The connection was never established, so any verb may be retried.
+                    if last_attempt:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if not retryable or last_attempt:
+                        raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._errors += 1
+            backend_failures.inc(method=method, endpoint=endpoint)
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        finally:
+            backend_seconds.observe(time.perf_counter() - started, method=method, endpoint=endpoint)
+            self._in_flight -= 1
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "requests": self._requests,
+            "errors": self._errors,
+        }
@@ -0,0 +1,194 @@
+"""
+asyncio execution mode: an aiohttp webhook server, a pooled aiohttp backend client and
+pyTelegramBotAPI's AsyncTeleBot. Run it instead of the Flask app with:
+
+    python async_bot.py
+
+The handlers are the ones in handlers.py, awaited on the event loop, and the role cache,
+conversation store, update deduplicator, product catalogue, outbox and analytics are the
+shared components in services.py. Replies and edits go through the same rate-limited
+outbound scheduler as in the Flask mode. Work that blocks (outbox writes, catalogue
+reloads, the order analytics seed and CSV imports) runs in threads.
+"""
+import asyncio
+import os
+import logging
+import telebot
+from aiohttp import web
+from telebot.async_telebot import AsyncTeleBot
+from async_backend import AsyncBackendClient
+from backend import API_URL, CLOSED, HALF_OPEN, OPEN
+from ingest import AsyncIngestion, UPDATE_QUEUE_SIZE
+from metrics import registry
+from sender import INTERACTIVE
+from logsetup import SAMPLED, correlation, setup_logging, update_summary
+
+setup_logging()
+
+from services import SEND_MODE, TOKEN, deduplicator, make_scheduler, outbox, stage_seconds
+from handlers import Handlers, register
+
+bot = AsyncTeleBot(TOKEN, validate_token=False)
+
+# Coroutines are cheap, so the async mode can keep many more updates in flight than
+# the thread pool of the Flask mode.
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", 64))
+api = AsyncBackendClient(API_URL, pool_size=ASYNC_WORKERS)
+
+# Seconds a background thread waits for the event loop to run one of its coroutines.
+THREAD_CALL_TIMEOUT = 30.0
+
+webhook_errors = registry.counter("bot_webhook_errors_total", "Webhook requests answered with HTTP 500.")
+
+async def process_update(json_data):
+    with correlation(json_data.get("update_id")):
+        with stage_seconds.time(stage="de_json"):
+            update = telebot.types.Update.de_json(json_data)
+        with stage_seconds.time(stage="dispatch"):
+            await bot.process_new_updates([update])
+
+ingestion = AsyncIngestion(process_update, workers=ASYNC_WORKERS, maxsize=UPDATE_QUEUE_SIZE)
+
+async def webhook(request):
+    try:
+        json_data = await request.json()
+    except ValueError:
+        return web.Response(status=400, text="Bad Request")
+    if not isinstance(json_data, dict) or not isinstance(json_data.get("update_id"), int):
+        return web.Response(status=400, text="Bad Request")
+    update_id = json_data["update_id"]
+    if deduplicator.is_duplicate(update_id):
+        logging.info("Dropping duplicate update", extra={**SAMPLED, "fields": update_summary(json_data)})
+        return web.Response(text="OK")
+    logging.info("Received update", extra={**SAMPLED, "fields": update_summary(json_data)})
+    try:
+        queued = ingestion.submit(json_data)
+    except Exception as e:
+        logging.error(f"Error processing webhook: {e}")
+        webhook_errors.inc()
+        deduplicator.forget(update_id)
+        return web.Response(status=500, text="Internal Server Error")
+    if not queued:
+        logging.warning(f"Update queue full, shedding update {update_id}")
+        # Telegram will retry the update, which must not be mistaken for a duplicate.
+        deduplicator.forget(update_id)
+        return web.Response(status=503, text="Service Unavailable", headers={"Retry-After": "1"})
+    return web.Response(text="OK")
+
+async def index(request):
+    return web.Response(text="Telegram Bot is running!")
+
+async def metrics(request):
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def deliver(chat_id, text, **kwargs):
+    with stage_seconds.time(stage="send_message"):
+        return await bot.send_message(chat_id, text, **kwargs)
+
+def on_loop(coroutine_function):
+    """
+    Wraps a coroutine function for the scheduler's sender threads, which run it on the
+    event loop and wait for its result.
+    """
+    def call(*args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(*args, **kwargs), bot_io.loop)
+        return future.result(THREAD_CALL_TIMEOUT)
+    return call
+
+# The same outbound scheduler as the Flask mode, so replies get the same per-chat and
+# global rate limits, coalescing and 429 handling.
+scheduler = make_scheduler(on_loop(deliver))
+
+async def call_telegram(chat_id, coroutine_function, *args, priority=INTERACTIVE, **kwargs):
+    """
+    Makes a Telegram call concerning a chat, e.g. an edit, through the outbound scheduler
+    and awaits its result.
+    """
+    if SEND_MODE == "direct":
+        return await coroutine_function(*args, **kwargs)
+    future = scheduler.call(chat_id, on_loop(coroutine_function), *args, priority=priority, **kwargs)
+    return await asyncio.wrap_future(future)
+
+class AsyncIO:
+    """
+    I/O adapter for the shared handlers (see handlers.py) in the asyncio mode. Blocking
+    work is moved to threads; background threads reach the bot through the event loop.
+    """
+
+    def __init__(self):
+        self.api = api
+        self.loop = None
+
+    async def send(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        if SEND_MODE == "direct":
+            await deliver(chat_id, text, **kwargs)
+        else:
+            scheduler.submit(chat_id, text, priority, **kwargs)
+
+    async def send_now(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        return await call_telegram(chat_id, deliver, chat_id, text, priority=priority, **kwargs)
+
+    async def edit(self, text, chat_id, message_id, priority=INTERACTIVE, **kwargs):
+        return await call_telegram(chat_id, bot.edit_message_text, text, chat_id, message_id, priority=priority, **kwargs)
+
+    async def answer_inline(self, query_id, results, **kwargs):
+        return await bot.answer_inline_query(query_id, results, **kwargs)
+
+    async def get_file(self, file_id):
+        return await bot.get_file(file_id)
+
+    def file_url(self, file_path):
+        return (telebot.asyncio_helper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(TOKEN, file_path)
+
+    async def blocking(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def call_from_thread(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(THREAD_CALL_TIMEOUT)
+
+bot_io = AsyncIO()
+handlers = Handlers(bot_io)
+register(bot, handlers)
+
+registry.sampled("bot_update_queue_depth", "Updates waiting for an ingestion worker.", ingestion.depth)
+registry.sampled("bot_send_queue_depth", "Messages waiting in the outbound scheduler.", scheduler.depth)
+registry.sampled("bot_updates_total", "Updates seen by the ingestion pool, by outcome.",
+                 lambda: {key: value for key, value in ingestion.stats().items() if key in ("accepted", "rejected", "failed")},
+                 type="counter", label="outcome")
+registry.sampled("bot_messages_total", "Outbound messages, by outcome.",
+                 lambda: {key: value for key, value in scheduler.stats().items() if key in ("sent", "coalesced", "rate_limited", "failed")},
+                 type="counter", label="outcome")
+registry.sampled("bot_backend_circuit_state", "Backend circuit breaker state (0 closed, 1 half-open, 2 open).",
+                 lambda: {group: {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[breaker.state] for group, breaker in api.breakers.items()},
+                 label="group")
+registry.sampled("bot_backend_circuit_rejected_total", "Backend requests failed fast by an open circuit breaker.",
+                 lambda: {group: breaker.rejected for group, breaker in api.breakers.items()},
+                 type="counter", label="group")
+registry.sampled("bot_backend_connections", "Backend connection pool usage.",
+                 lambda: {key: value for key, value in api.stats().items() if key in ("in_flight", "peak_in_flight")},
+                 label="state")
+
+async def on_startup(app):
+    bot_io.loop = asyncio.get_running_loop()
+    ingestion.start()
+    # Deliver whatever a previous run left in the outbox.
+    outbox.start()
+
+async def on_cleanup(app):
+    await ingestion.stop()
+    await api.close()
+    await bot.close_session()
+
+def create_app():
+    app = web.Application()
+    app.router.add_post(f"/{TOKEN}", webhook)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/", index)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    logging.info(f"Starting aiohttp app on port {port}")
+    web.run_app(create_app(), host="0.0.0.0", port=port)
@@ -0,0 +1,239 @@
+import os
+import logging
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import registry
+
+# API URL (replace with your actual ngrok URL or hosted API URL)
+API_URL = os.environ.get("API_URL", "https://0bab-218-111-149-235.ngrok-free.app")
+
+# Number of threads that may talk to the backend at once; the connection pool is
+# sized to match so that no worker has to wait for (or open) an extra connection.
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 8))
+
+CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", 10))
+MAX_RETRIES = int(os.environ.get("BACKEND_MAX_RETRIES", 2))
+RETRY_BACKOFF = float(os.environ.get("BACKEND_RETRY_BACKOFF", 0.3))
+
+# Only verbs that are safe to repeat are retried after the request was sent.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+# Each group of endpoints gets its own circuit breaker: after BREAKER_FAILURE_THRESHOLD
+# consecutive failures its requests fail fast for BREAKER_RESET_TIMEOUT seconds, then
+# BREAKER_HALF_OPEN_PROBES trial requests decide whether it closes again.
+BREAKER_GROUPS = ("users", "products", "orders")
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", 30))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", 1))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+backend_seconds = registry.histogram(
+    "bot_backend_request_seconds", "Backend request latency by endpoint.", labels=("method", "endpoint"))
+backend_failures = registry.counter(
+    "bot_backend_failures_total", "Backend requests that raised or returned a 5xx status.", labels=("method", "endpoint"))
+
+
+def endpoint_label(path):
+    """
+    Collapses ids in a request path so that, e.g., '/orders/42' and '/orders/7' share one series.
+    """
+    return re.sub(r"/[0-9]+(?=/|$)", "/{id}", path.split("?", 1)[0])
+
+
+def endpoint_group(path):
+    """
+    :return: The breaker group of a request path, e.g. 'orders' for '/orders/user/42'.
+    """
+    return path.lstrip("/").split("/", 1)[0].split("?", 1)[0] or "root"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request while the breaker of its endpoint group is open.
+    """
+
+    def __init__(self, group, retry_in):
+        super().__init__(f"Backend unavailable ({group}), retrying in {retry_in:.0f}s")
+        self.group = group
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. Closed, it lets every request through; open, it
+    rejects them until reset_timeout has passed; half-open, it admits a limited number of
+    probe requests whose outcome closes or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                 half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def before_request(self):
+        """
+        Admits or rejects a request.
+        :raises CircuitOpenError: If the breaker is open, or half-open with all probes in flight.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                    logging.warning(f"Circuit breaker for {self.name} opened after {self._failures} failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self._failures, "opened": self.opened, "rejected": self.rejected}
+
+
+def make_breakers():
+    return {group: CircuitBreaker(group) for group in BREAKER_GROUPS}
+
+
+class BackendClient:
+    """
+    Shared HTTP client for the REST backend, backed by a keep-alive connection pool.
+    :param base_url: Base URL of the backend; request paths are appended to it.
+    :param pool_size: Maximum number of pooled connections to the backend host.
+    """
+
+    def __init__(self, base_url, pool_size=BOT_WORKERS, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self.breakers = make_breakers()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._errors = 0
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the backend with the default timeouts applied.
+        Connection errors, timeouts and 5xx responses count against the endpoint
+        group's circuit breaker.
+        :param path: Path relative to the base URL, e.g. '/products'.
+        :return: requests.Response object.
+        :raises CircuitOpenError: If the endpoint group's breaker is open.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        breaker = self.breakers.get(endpoint_group(path))
+        if breaker is not None:
+            breaker.before_request()
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        endpoint = endpoint_label(path)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            if response.status_code >= 500:
+                backend_failures.inc(method=method, endpoint=endpoint)
+                if breaker is not None:
+                    breaker.record_failure()
+            elif breaker is not None:
+                breaker.record_success()
+            return response
+        except requests.RequestException:
+            backend_failures.inc(method=method, endpoint=endpoint)
+            if breaker is not None:
+                breaker.record_failure()
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            backend_seconds.observe(time.perf_counter() - started, method=method, endpoint=endpoint)
+            with self._lock:
+                self._in_flight -= 1
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def stats(self):
+        """
+        :return: Dictionary describing request counters and connection pool utilisation.
+        """
+        opened = 0
+        idle = 0
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "connections_opened": opened,
+                "connections_idle": idle,
+                "requests": self._requests,
+                "errors": self._errors,
+            }
+
+
+api = BackendClient(API_URL)
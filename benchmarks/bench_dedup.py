@@ -0,0 +1,46 @@
+"""
+Benchmarks UpdateDeduplicator at a sustained 100k updates/min with ~5% re-deliveries.
+Usage: python benchmarks/bench_dedup.py [window ...]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import UpdateDeduplicator
+
+UPDATES_PER_MINUTE = 100_000
+DUPLICATE_RATE = 0.05
+
+
+def run(window):
+    random.seed(0)
+    stream = []
+    for update_id in range(UPDATES_PER_MINUTE):
+        stream.append(update_id)
+        if random.random() < DUPLICATE_RATE:
+            stream.append(update_id - random.randint(0, 50))
+
+    tracemalloc.start()
+    dedup = UpdateDeduplicator(window)
+    start = time.perf_counter()
+    for update_id in stream:
+        dedup.is_duplicate(update_id)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"window={window:>7}  updates={len(stream)}  duplicates={dedup.duplicates}  "
+        f"{elapsed / len(stream) * 1e9:6.0f} ns/update  {len(stream) / elapsed:,.0f} updates/s  "
+        f"peak memory={peak / 1024:,.0f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    windows = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for window in windows:
+        run(window)
@@ -0,0 +1,46 @@
+"""
+Compares building the role menu per call (the previous get_main_menu) with serving the
+pre-encoded menus from views.MAIN_MENUS, including the JSON encoding done on every send.
+Usage: python benchmarks/bench_menus.py [iterations]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from views import COMMON_MENU_ROW, MAIN_MENUS, MENU_LAYOUTS, build_menu
+
+
+def rebuild(role):
+    return build_menu(MENU_LAYOUTS[role.lower()] + (COMMON_MENU_ROW,)).to_json()
+
+
+def cached(role):
+    return MAIN_MENUS[role.lower()].to_json()
+
+
+def measure(name, func, iterations):
+    roles = ["Admin", "moderator", "User"]
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(roles[i % 3])
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    func("Admin")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<8} {elapsed / iterations * 1e6:8.2f} us/call  {peak - baseline:7,} bytes peak allocation/call")
+    return elapsed
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    slow = measure("rebuild", rebuild, iterations)
+    fast = measure("cached", cached, iterations)
+    print(f"speed-up: {slow / fast:.0f}x")
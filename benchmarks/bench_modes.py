@@ -0,0 +1,131 @@
+"""
+Compares updates/sec of the Flask webhook mode (bot.py) and the asyncio mode (async_bot.py).
+Each mode runs in its own process against a local fake backend and fake Telegram API with
+injected latency; updates are posted to the webhook and counted as done once the bot's
+reply reaches the fake Telegram API. Updates the webhook sheds (HTTP 503) or fails are
+reported separately and not waited for.
+Usage: python benchmarks/bench_modes.py [--updates N] [--concurrency C] [--posters P] [--latency SECONDS]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeServer, backend_route, make_update, telegram_route
+
+TOKEN = "123456:BENCHMARK"
+
+
+def serve(mode, port, telegram_url):
+    """
+    Runs the bot in the given mode; executed in a child process.
+    """
+    from telebot import apihelper, asyncio_helper
+    apihelper.API_URL = asyncio_helper.API_URL = f"{telegram_url}/bot{{0}}/{{1}}"
+    if mode == "flask":
+        from werkzeug.serving import make_server
+        import bot
+        make_server("127.0.0.1", port, bot.app, threaded=True).serve_forever()
+    else:
+        from aiohttp import web
+        import async_bot
+        web.run_app(async_bot.create_app(), host="127.0.0.1", port=port, print=None)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def run(mode, args):
+    replies = [0]
+    # Number of replies to wait for, known once every update has been posted.
+    expected = [None]
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def on_send(chat_id):
+        with lock:
+            replies[0] += 1
+            if expected[0] is not None and replies[0] >= expected[0]:
+                done.set()
+
+    backend = FakeServer(backend_route(), latency=args.latency).start()
+    telegram = FakeServer(telegram_route(on_send), latency=args.latency).start()
+    port = free_port()
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=TOKEN, API_URL=backend.url, SEND_MODE="direct",
+               BOT_WORKERS=str(args.concurrency), ASYNC_WORKERS=str(args.concurrency))
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port), "--telegram", telegram.url],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{port}/")
+        session = requests.Session()
+        webhook_url = f"http://127.0.0.1:{port}/{TOKEN}"
+        updates = [make_update(i + 1, 1000 + i % 500, callback_data="view_all_products" if i % 2 else None,
+                               text=None if i % 2 else "/help") for i in range(args.updates)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.posters) as pool:
+            statuses = Counter(pool.map(lambda update: session.post(webhook_url, json=update, timeout=30).status_code, updates))
+        with lock:
+            # Only accepted updates are answered; shed and failed ones would be retried by Telegram.
+            expected[0] = statuses[200]
+            if replies[0] >= expected[0]:
+                done.set()
+        done.wait(timeout=120)
+        elapsed = time.perf_counter() - started
+        # Counted before teardown, which can cut short sends still in flight.
+        with lock:
+            answered = replies[0]
+    finally:
+        child.terminate()
+        child.wait()
+        backend.stop()
+        telegram.stop()
+
+    shed = statuses[503]
+    failed = args.updates - statuses[200] - shed
+    print(f"{mode:<6} {answered}/{statuses[200]} accepted updates in {elapsed:.2f}s = {answered / elapsed:,.0f} updates/s, "
+          f"{shed} shed, {failed} failed ({backend.total()} backend calls, {telegram.total()} Telegram calls)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--posters", type=int, default=16, help="Concurrent webhook POSTs")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency injected into every fake API call")
+    parser.add_argument("--serve", choices=["flask", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--telegram", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port, args.telegram)
+    else:
+        for mode in ("flask", "async"):
+            run(mode, args)
@@ -0,0 +1,60 @@
+"""
+Measures inline-search lookups on a synthetic catalogue: index build time, then the
+latency of typical queries both cold (first keystroke) and warm (repeated prefix), and
+the cost of syncing the index with a reloaded catalogue.
+Usage: python benchmarks/bench_search.py [products]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import ProductIndex
+
+QUERIES = ["", "a", "a b", "ab", "abc", "{word}", "{word} {prefix}", "zzzzzz"]
+
+
+def synthetic_catalogue(count, vocabulary=20000, seed=1):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(vocabulary)]
+    products = [
+        {"id": i, "name": " ".join(rng.choices(words, k=3)), "description": " ".join(rng.choices(words, k=8)), "price": 9.99}
+        for i in range(count)
+    ]
+    return products, words
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    products, words = synthetic_catalogue(count)
+    index = ProductIndex()
+    _, build_ms = timed(index.build, products)
+    print(f"build    {count:,} products, {index.stats()['tokens']:,} tokens in {build_ms:.0f} ms")
+
+    for template in QUERIES:
+        query = template.format(word=words[5], prefix=words[9][:2])
+        (results, next_offset), cold_ms = timed(index.search, query)
+        warm_ms = min(timed(index.search, query)[1] for _ in range(20))
+        _, deep_ms = timed(index.search, query, 200)
+        print(f"{query!r:<18} {len(results):3} results  cold {cold_ms:6.2f} ms  warm {warm_ms:6.2f} ms  offset 200 {deep_ms:6.2f} ms")
+
+    _, write_ms = timed(index.upsert, {"id": count, "name": "Fresh widget", "description": "new", "price": 1.0})
+    print(f"upsert   {write_ms:.2f} ms")
+    index.remove(count)
+
+    # Periodic catalogue reloads: a fresh copy of the list, as decoded from the backend.
+    reloaded = [dict(product) for product in products]
+    _, same_ms = timed(index.sync, reloaded)
+    for product in reloaded[::100]:
+        product["name"] += " renamed"
+    changed, changed_ms = timed(index.sync, reloaded)
+    print(f"reload   unchanged {same_ms:.0f} ms, {changed:,} changed {changed_ms:.0f} ms (build {build_ms:.0f} ms)")
@@ -0,0 +1,211 @@
+"""
+Local stand-ins for the REST backend (API_URL) and the Telegram Bot API, used by the
+benchmarks. Both run on ThreadingHTTPServer in background threads and count requests.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients going away mid-request is expected when a run is torn down.
+        pass
+
+
+class FakeServer:
+    """
+    Background HTTP server that answers with a routing function and counts requests.
+    :param route: Callable invoked as route(method, path, query, body) returning (status, payload).
+    :param latency: Seconds slept before every response.
+    :param error_rate: Fraction of requests answered with HTTP 500 instead.
+    :param observe: Optional callable invoked as observe(method, path, params) for every
+                    request, including those that get an injected failure.
+    """
+
+    def __init__(self, route, latency=0.0, error_rate=0.0, seed=0, observe=None):
+        self.route = route
+        self.observe = observe
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.counts = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                url = urlparse(self.path)
+                status, payload = server.dispatch(self.command, url.path, url.query, raw)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = QuietHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def dispatch(self, method, path, query, raw):
+        if self.observe:
+            self.observe(method, path, request_params(query, raw))
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            key = f"{method} {re.sub(r'/[0-9]+', '/{id}', path)}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return 500, {"error": "injected failure"}
+        return self.route(method, path, query, raw)
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def request_params(query, raw):
+    """
+    Merges query-string and body parameters (JSON or form-encoded) of a request.
+    """
+    params = {key: values[0] for key, values in parse_qs(query).items()}
+    if raw:
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            body = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+        if isinstance(body, dict):
+            params.update(body)
+    return params
+
+
+def backend_route(products=100, orders=100):
+    """
+    Builds a routing function emulating the REST backend's endpoints.
+    """
+    catalogue = [{"id": i, "name": f"Product {i}", "description": "Benchmark product", "price": 9.99}
+                 for i in range(products)]
+    order_list = [{"id": i, "product_id": i % max(products, 1), "quantity": 1, "order_date": "2026-01-01"}
+                  for i in range(orders)]
+
+    def route(method, path, query, raw):
+        if path.startswith("/users/check/"):
+            return 200, {"role": "Admin"}
+        if path == "/users/add":
+            return 200, {"status": "ok"}
+        if path == "/products":
+            return (201, {"id": len(catalogue)}) if method == "POST" else (200, catalogue)
+        if path.startswith("/products/"):
+            return 200, {"status": "ok"}
+        if path == "/orders":
+            return (201, {"id": len(order_list)}) if method == "POST" else (200, order_list)
+        if path.startswith("/orders/"):
+            return 200, order_list if method == "GET" else {"status": "ok"}
+        return 404, {"error": "not found"}
+
+    return route
+
+
+class UpdateFeed:
+    """
+    Updates waiting to be fetched through the fake getUpdates, which honours offset,
+    limit and the long-poll timeout like the real one.
+    """
+
+    def __init__(self):
+        self._updates = deque()
+        self._cond = threading.Condition()
+
+    def push(self, update):
+        with self._cond:
+            self._updates.append(update)
+            self._cond.notify_all()
+
+    def fetch(self, offset, limit, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Updates below the offset have been confirmed by the client.
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            return [self._updates[index] for index in range(min(limit, len(self._updates)))]
+
+
+def telegram_route(on_send=None, feed=None):
+    """
+    Builds a routing function emulating the Telegram Bot API methods the bot calls.
+    :param on_send: Optional callable invoked with the chat_id of every sent message.
+    :param feed: Optional UpdateFeed served by getUpdates.
+    """
+    message_id = [0]
+
+    def route(method, path, query, raw):
+        api_method = path.rsplit("/", 1)[-1]
+        params = request_params(query, raw)
+        if api_method == "getUpdates":
+            if feed is None:
+                return 200, {"ok": True, "result": []}
+            result = feed.fetch(int(params.get("offset", 0)), int(params.get("limit", 100)), float(params.get("timeout", 0)))
+            return 200, {"ok": True, "result": result}
+        if api_method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            if on_send:
+                on_send(chat_id)
+            message_id[0] += 1
+            return 200, {"ok": True, "result": {
+                "message_id": message_id[0], "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", ""),
+            }}
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}}
+        return 200, {"ok": True, "result": True}
+
+    return route
+
+
+def make_update(update_id, chat_id, text=None, callback_data=None):
+    """
+    Builds a raw Telegram update: a text message, or a callback query if callback_data is given.
+    """
+    user = {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": f"user{chat_id}"}
+    chat = {"id": chat_id, "type": "private"}
+    if callback_data is not None:
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": str(chat_id), "data": callback_data,
+            "message": {"message_id": 1, "date": 0, "chat": chat, "text": "menu"},
+        }}
+    message = {"message_id": update_id, "date": 0, "chat": chat, "from": user, "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
@@ -0,0 +1,278 @@
+"""
+Reproducible load test for the Flask webhook mode and the long-polling runner.
+
+Starts local stand-ins for the REST backend and the Telegram Bot API (with configurable
+latency and error rates), replays a synthetic stream of updates (/start, menu clicks,
+add product, place order) into webhook() at a target rate and reports latency percentiles,
+throughput, backend calls per update and memory. Every update in the stream produces
+exactly one outgoing message, so end-to-end latency is measured from posting an update
+to the bot's reply reaching the fake Telegram API. With --runner polling the updates are
+queued on the fake getUpdates instead and fetched by bot.poller.
+
+Usage:
+    python benchmarks/loadtest.py --rate 200 --duration 20 --output results.json
+    python benchmarks/loadtest.py --compare results.json
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeServer, UpdateFeed, backend_route, make_update, telegram_route
+
+TOKEN = "123456:LOADTEST"
+
+# Each scenario is a short session of updates sent by one chat, in order.
+SCENARIOS = {
+    "start": lambda: [("text", "/start")],
+    "menu": lambda: [("callback", random.choice(["view_all_products", "view_all_orders", "view_all_ordersByUser"]))],
+    "add_product": lambda: [("callback", "add_new_product"), ("text", f"Load test item,Synthetic,{random.randint(1, 99)}.99")],
+    "place_order": lambda: [("callback", "place_order"), ("text", f"{random.randint(1, 50)},{random.randint(1, 5)}")],
+}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_stream(count, users, mix):
+    """
+    Builds `count` updates from randomly chosen scenario sessions. Sessions of one chat
+    never interleave, so multi-step flows see their own replies.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stream = []
+    session = 0
+    while len(stream) < count:
+        chat_id = 10_000 + session % users
+        for kind, value in SCENARIOS[random.choices(names, weights)[0]]():
+            update_id = len(stream) + 1
+            if kind == "text":
+                stream.append(make_update(update_id, chat_id, text=value))
+            else:
+                stream.append(make_update(update_id, chat_id, callback_data=value))
+        session += 1
+    return stream[:count]
+
+
+def chat_of(update):
+    if "message" in update:
+        return update["message"]["chat"]["id"]
+    return update["callback_query"]["message"]["chat"]["id"]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    random.seed(args.seed)
+    pending = collections.defaultdict(collections.deque)
+    end_to_end = []
+    lock = threading.Lock()
+    done = threading.Event()
+    expected = [0]
+
+    def observe_telegram(method, path, params):
+        if not path.endswith(("/sendMessage", "/editMessageText")):
+            return
+        now = time.perf_counter()
+        with lock:
+            queue = pending.get(int(params.get("chat_id", 0)))
+            if queue:
+                end_to_end.append(now - queue.popleft())
+                if len(end_to_end) >= expected[0]:
+                    done.set()
+
+    backend = FakeServer(backend_route(args.products, args.orders), latency=args.backend_latency,
+                         error_rate=args.backend_errors, seed=args.seed).start()
+    feed = UpdateFeed()
+    telegram = FakeServer(telegram_route(feed=feed), latency=args.telegram_latency, error_rate=args.telegram_errors,
+                          seed=args.seed, observe=observe_telegram).start()
+
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": TOKEN,
+        "API_URL": backend.url,
+        "SEND_MODE": args.send_mode,
+        "WEBHOOK_MODE": args.webhook_mode,
+        "BOT_WORKERS": str(args.workers),
+        "POLL_TIMEOUT": "1",
+        # A fresh outbox per run, so writes left over from an earlier run are not replayed.
+        "OUTBOX_PATH": os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "outbox.db"),
+    })
+    from telebot import apihelper
+    apihelper.API_URL = f"{telegram.url}/bot{{0}}/{{1}}"
+    import bot
+    logging.getLogger().setLevel(logging.WARNING)
+
+    stream = build_stream(args.rate * args.duration, args.users, parse_mix(args.mix))
+    expected[0] = len(stream)
+    rss_before = rss_mb()
+    local = threading.local()
+    acks = []
+    statuses = collections.Counter()
+
+    def post(update):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = bot.app.test_client()
+        with lock:
+            pending[chat_of(update)].append(time.perf_counter())
+        started = time.perf_counter()
+        response = client.post(f"/{TOKEN}", json=update)
+        elapsed = time.perf_counter() - started
+        with lock:
+            acks.append(elapsed)
+            statuses[response.status_code] += 1
+
+    def enqueue(update):
+        with lock:
+            pending[chat_of(update)].append(time.perf_counter())
+        feed.push(update)
+
+    # One single-threaded poster per group of chats keeps each chat's updates in order.
+    posters = [ThreadPoolExecutor(max_workers=1) for _ in range(args.clients)]
+    if args.runner == "polling":
+        bot.poller.start()
+    started = time.perf_counter()
+    for index, update in enumerate(stream):
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if args.runner == "polling":
+            enqueue(update)
+        else:
+            posters[chat_of(update) % len(posters)].submit(post, update)
+    for poster in posters:
+        poster.shutdown(wait=True)
+    done.wait(timeout=args.drain_timeout)
+    elapsed = time.perf_counter() - started
+    polling = bot.poller.stats()
+    bot.poller.stop()
+
+    backend_calls = backend.total()
+    backend.stop()
+    telegram.stop()
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "updates": len(stream),
+        "completed": len(end_to_end),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(end_to_end) / elapsed, 1),
+        "latency_ms": {
+            name: round(percentile(end_to_end, fraction) * 1000, 2) if end_to_end else None
+            for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "ack_latency_ms": {
+            name: round(percentile(acks, fraction) * 1000, 2) if acks else None
+            for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "webhook_statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "polling": {key: polling[key] for key in ("batches", "mean_batch_size", "backpressure_waits", "backpressure_seconds")}
+        if args.runner == "polling" else None,
+        "backend_calls": backend_calls,
+        "backend_calls_per_update": round(backend_calls / len(stream), 3),
+        "backend_errors_injected": backend.errors,
+        "telegram_calls": telegram.total(),
+        "rss_mb": {"before": round(rss_before, 1), "peak": round(rss_mb(), 1)},
+    }
+    return result
+
+
+def print_result(result, baseline=None):
+    def delta(value, old):
+        if old in (None, 0) or value is None:
+            return ""
+        return f" ({(value - old) / old * 100:+.1f}%)"
+
+    base = baseline or {}
+    print(f"updates        {result['completed']}/{result['updates']} completed in {result['elapsed_s']}s")
+    print(f"throughput     {result['updates_per_s']} updates/s{delta(result['updates_per_s'], base.get('updates_per_s'))}")
+    for name, value in result["latency_ms"].items():
+        old = base.get("latency_ms", {}).get(name)
+        print(f"latency {name}    {value} ms{delta(value, old)}")
+    if result.get("polling"):
+        polling = result["polling"]
+        print(f"polling        {polling['batches']} batches, {polling['mean_batch_size']:.1f} updates/batch, "
+              f"{polling['backpressure_waits']} backpressure waits ({polling['backpressure_seconds']:.2f}s)")
+    else:
+        print(f"ack p99        {result['ack_latency_ms']['p99']} ms  statuses {result['webhook_statuses']}")
+    print(f"backend calls  {result['backend_calls_per_update']} per update"
+          f"{delta(result['backend_calls_per_update'], base.get('backend_calls_per_update'))}")
+    print(f"memory         peak RSS {result['rss_mb']['peak']} MB"
+          f"{delta(result['rss_mb']['peak'], base.get('rss_mb', {}).get('peak'))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=100, help="Target updates per second")
+    parser.add_argument("--duration", type=int, default=10, help="Seconds of updates to generate")
+    parser.add_argument("--users", type=int, default=200, help="Number of distinct chats")
+    parser.add_argument("--mix", default="start=1,menu=4,add_product=1,place_order=2",
+                        help="Scenario weights, e.g. start=1,menu=4")
+    parser.add_argument("--backend-latency", type=float, default=0.02)
+    parser.add_argument("--backend-errors", type=float, default=0.0, help="Fraction of backend calls failing with 500")
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--telegram-errors", type=float, default=0.0, help="Fraction of Telegram calls failing with 500")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=16, help="BOT_WORKERS for the bot")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent webhook posters")
+    parser.add_argument("--runner", default="webhook", choices=["webhook", "polling"],
+                        help="Feed updates through webhook() or through the long-polling runner")
+    parser.add_argument("--webhook-mode", default="async", choices=["async", "sync"])
+    parser.add_argument("--send-mode", default="direct", choices=["direct", "scheduled"])
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_result(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.output}")
@@ -1,544 +1,199 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 import telebot
 import os
 import logging
-import requests
-from telebot.types import ReplyKeyboardRemove
+from backend import api, BOT_WORKERS, CLOSED, HALF_OPEN, OPEN
+from ingest import IngestionPool, UPDATE_QUEUE_SIZE
+from sender import INTERACTIVE
+from metrics import registry
+from polling import PollingRunner
+from logsetup import SAMPLED, correlation, setup_logging, update_summary
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Configure logging: records are queued and written by a background thread (see logsetup),
+# LOG_FORMAT=json switches to structured output.
+setup_logging()
 
-# Load Telegram Bot Token from environment variables
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-if not TOKEN:
-    raise ValueError("Error: TELEGRAM_BOT_TOKEN environment variable is not set.")
-bot = telebot.TeleBot(TOKEN)
+from services import SEND_MODE, TOKEN, deduplicator, make_scheduler, outbox, stage_seconds
+from handlers import BlockingBackend, Handlers, register, run_sync, synchronous
 
-# Flask app for handling webhooks
-app = Flask(__name__)
+# Handlers run on the thread that processes the update (see WEBHOOK_MODE below)
+# rather than on telebot's own unbounded thread pool.
+bot = telebot.TeleBot(TOKEN, threaded=False)
 
-# API URL (replace with your actual ngrok URL or hosted API URL)
-API_URL = "https://0bab-218-111-149-235.ngrok-free.app"
+webhook_errors = registry.counter("bot_webhook_errors_total", "Webhook requests answered with HTTP 500.")
 
-@app.route(f"/{TOKEN}", methods=["POST"])
-def webhook():
-    logging.info("Webhook endpoint hit")
-    try:
-        json_data = request.get_json()
-        logging.info(f"Received update: {json_data}")
-        bot.process_new_updates([telebot.types.Update.de_json(json_data)])
-        return "OK", 200
-    except Exception as e:
-        logging.error(f"Error processing webhook: {e}")
-        return "Internal Server Error", 500
+def deliver(chat_id, text, **kwargs):
+    with stage_seconds.time(stage="send_message"):
+        return bot.send_message(chat_id, text, **kwargs)
 
-def get_main_menu(role):
+# Replies go through the outbound scheduler unless SEND_MODE=direct (see services).
+scheduler = make_scheduler(deliver)
+
+def send_message(chat_id, text, priority=INTERACTIVE, **kwargs):
     """
-    Generates a main menu inline keyboard dynamically based on the user's role.
-    :param role: The role of the user (e.g., 'admin', 'moderator', 'user').
-    :return: InlineKeyboardMarkup object with buttons tailored to the user's role.
+    Sends a message to a chat through the outbound scheduler.
+    :param priority: INTERACTIVE for replies to the user, BULK for long-running output.
     """
-    logging.info(f"Generating main menu keyboard for role: {role}")
-    keyboard = telebot.types.InlineKeyboardMarkup()
-
-    # Admin-specific menu options
-    if role == "Admin" or role == "admin":
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("View All Products", callback_data="view_all_products"),
-            telebot.types.InlineKeyboardButton("Add New Product", callback_data="add_new_product"),
-            telebot.types.InlineKeyboardButton("Update Product", callback_data="update_product"),
-            telebot.types.InlineKeyboardButton("Delete Product", callback_data="delete_product"),
-        )
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("View All Orders", callback_data="view_all_orders"),
-            telebot.types.InlineKeyboardButton("Delete Orders", callback_data="delete_orders"),
-        )
-
-    # Moderator-specific menu options
-    elif role == "Moderator" or role == "moderator":
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("View All Products", callback_data="view_all_products"),
-            telebot.types.InlineKeyboardButton("Add New Product", callback_data="add_new_product"),
-            telebot.types.InlineKeyboardButton("Update Product", callback_data="update_product"),
-        )
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("View All Orders", callback_data="view_all_orders"),
-        )
-
-    # User-specific menu options
-    elif role == "User" or role == "user":
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("View All Products", callback_data="view_all_products"),
-        )
-        keyboard.add(
-            telebot.types.InlineKeyboardButton("Place an Order", callback_data="place_order"),
-            telebot.types.InlineKeyboardButton("View My Orders", callback_data="view_all_ordersByUser"),
-        )
-
-    else :
-        bot.send_message(
-            role.chat.id,
-            f"You have no role, kindly use '/start' to select roles.",
-        )
-        return None
-
-    # Common options for all roles
-    keyboard.add(
-  telebot.types.InlineKeyboardButton("Start", callback_data="start"),
-        telebot.types.InlineKeyboardButton("Help", callback_data="help"),
-        telebot.types.InlineKeyboardButton("Info", callback_data="info")
-    )
-
-    return keyboard
-
-# Check if user exists and fetch their role
-def check_user_role(chat_id):
-    try:
-        response = requests.get(f"{API_URL}/users/check/{chat_id}")
-        if response.status_code == 200:
-            return response.json()["role"]  # Return the role if the user exists
-        else:
-            logging.warning(f"User not found: {chat_id}")
-            return None
-    except Exception as e:
-        logging.error(f"Error checking user existence: {e}")
-        return None
-
-
-# Process role selection in the bot
-@bot.callback_query_handler(func=lambda call: call.data == "start")
-@bot.message_handler(commands=["start"])
-def handle_start(message):
-    chat_id = message.chat.id
-    role = check_user_role(chat_id)
-
-    if role:
-        # If the user already has a role, show the menu
-        bot.send_message(
-            chat_id,
-            f"Welcome back, {message.from_user.first_name}!\n"
-            f"You are logged in as a '{role}'. Here is your menu:",
-            reply_markup=get_main_menu(role),
-        )
+    if SEND_MODE == "direct":
+        deliver(chat_id, text, **kwargs)
     else:
-        # If no role exists, prompt the user to select one
-        markup = telebot.types.ReplyKeyboardMarkup(one_time_keyboard=True, resize_keyboard=True)
-        markup.add("User", "Admin", "Moderator")
-        msg = bot.send_message(
-            chat_id,
-            "Hello! Welcome to the Mother Database Management System.\n"
-            "Please select your role to proceed:",
-            reply_markup=markup,
-        )
-        bot.register_next_step_handler(msg, process_role_selection)
-        ReplyKeyboardRemove()
-
-# Function to call the ngrok API to assign a role
-def update_role_via_api(username, chat_id, new_role):
-    url = f"{API_URL}/users/add"
-    payload = {
-        "username": username,
-        "chat_id": chat_id,
-        "role": new_role
-    }
-    logging.info(f"Sending payload to API: {payload}")
-
-    try:
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            return True
-        else:
-            error_message = response.json().get("error", "Unknown error")
-            logging.error(f"Failed to update/assign role: {error_message}")
-            return False
-    except ValueError:
-        logging.error("Invalid or empty response from the API.")
-        return False
-    except Exception as e:
-        logging.error(f"Error calling the update role API: {e}")
-        return False
-
-# Process role selection from user input
-def process_role_selection(message):
-    role = message.text.strip()
-    chat_id = message.from_user.id
-    username = message.from_user.username
-    logging.info(f"User {chat_id} selected role: {role}")
-
-    # Check if the role is valid
-    if role.lower() not in ["user", "admin", "moderator"]:
-        bot.send_message(
-            chat_id,
-            "Invalid role selected. Please try again.",
-            reply_markup=telebot.types.ReplyKeyboardRemove()
-        )
-        return
-
-    # If Admin or Moderator role is selected, verify credentials
-    if role.lower() in ["admin", "moderator"]:
-        bot.send_message(
-            chat_id,
-            f"To verify your credentials for the {role} role, please enter the passcode:"
-        )
-        bot.register_next_step_handler(message, lambda msg: verify_credentials(msg, role))
-        return
-
-    # For "User" role, directly assign without credentials
-    success = update_role_via_api(username, chat_id, role)
-    if success:
-        bot.send_message(
-            chat_id,
-            f"You have been assigned the '{role}' role. Here is your menu:",
-            reply_markup=get_main_menu(role)
-        )
-    else:
-        bot.send_message(
-            chat_id,
-            "Failed to assign role. Please try again or contact support."
-        )
-
-# Verify user credentials before assigning admin or moderator roles
-def verify_credentials(message, role):
-    username = message.from_user.username
-    user_input = message.text.strip()
-    chat_id = message.from_user.id
-    logging.info(f"Verifying credentials for user {chat_id} as {role}")
+        scheduler.submit(chat_id, text, priority, **kwargs)
 
-    # Example credential checks (replace with actual logic or API calls)
-    if (role.lower() == "admin" and user_input == "admin_passcode") or \
-       (role.lower() == "moderator" and user_input == "moderator_passcode"):
-        success = update_role_via_api(username, chat_id, role)
-        if success:
-            bot.send_message(
-                chat_id,
-                f"Your credentials are verified. You are now assigned the '{role}' role.",
-                reply_markup=get_main_menu(role)
-            )
-        else:
-            bot.send_message(
-                chat_id,
-                "Failed to assign role. Please contact support."
-            )
-    else:
-        bot.send_message(
-            chat_id,
-            "Invalid credentials. Please try again or contact support."
-        )
-
-@bot.message_handler(func=lambda message: True)  # Catches any unrecognized command or input
-def handle_unknown_command(message):
-    chat_id = message.from_user.id
-    role = check_user_role(chat_id)
-
-    if role:
-        keyboard = get_main_menu(role)
-        if keyboard:
-            bot.send_message(
-                chat_id,
-                "Please use the menu options below to interact with the system.",
-                reply_markup=keyboard
-            )
-        else:
-            bot.send_message(
-                chat_id,
-                "Error: Unable to generate menu. Please contact support."
-            )
-    else:
-        bot.send_message(
-            chat_id,
-            "You have not registered a role yet. Use /start to register your role."
-        )
-
-def view_all_products(chat_id):
-    try:
-        response = requests.get(f"{API_URL}/products")
-        if response.status_code == 200:
-            products = response.json()
-            message = "📦 **All Products**:\n\n"
-            for product in products:
-                message += f"- ID: {product['id']}\n"
-                message += f"  Name: {product['name']}\n"
-                message += f"  Description: {product['description']}\n"
-                message += f"  Price: {product['price']}\n\n"
-            bot.send_message(chat_id, message, parse_mode="Markdown")
-        else:
-            bot.send_message(chat_id, "❌ Failed to fetch products.")
-    except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
-
-def add_new_product(chat_id, product_data):
-    try:
-        response = requests.post(f"{API_URL}/products", json=product_data)
-        if response.status_code == 201:
-            bot.send_message(chat_id, "✅ Product added successfully.")
-        else:
-            bot.send_message(chat_id, "❌ Failed to add product.")
-    except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
-
-def update_product(chat_id, product_id, updated_data):
-    try:
-        response = requests.put(f"{API_URL}/products/{product_id}", json=updated_data)
-        if response.status_code == 200:
-            bot.send_message(chat_id, "✅ Product updated successfully.")
-        else:
-            bot.send_message(chat_id, "❌ Failed to update product.")
-    except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
-
-def delete_product(chat_id, product_id):
-    try:
-        response = requests.delete(f"{API_URL}/products/{product_id}")
-        if response.status_code == 200:
-            bot.send_message(chat_id, "✅ Product deleted successfully.")
-        else:
-            bot.send_message(chat_id, "❌ Failed to delete product.")
-    except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
-
-@bot.callback_query_handler(func=lambda call: call.data == "update_product")
-def handle_update_product(call):
-    chat_id = call.message.chat.id
-    bot.send_message(chat_id, "Please provide the product ID and the updated details in the format: product_id,name,description,price")
-    bot.register_next_step_handler(call.message, process_update_product)
-
-def process_update_product(message):
-    chat_id = message.chat.id
-    try:
-        product_id, name, description, price = message.text.split(",")
-        updated_data = {
-            "name": name.strip(),
-            "description": description.strip(),
-            "price": float(price.strip())
-        }
-        update_product(chat_id, product_id.strip(), updated_data)
-    except ValueError:
-        bot.send_message(chat_id, "Invalid format. Use: product_id,name,description,price.")
-
-@bot.callback_query_handler(func=lambda call: call.data == "delete_product")
-def handle_delete_product(call):
-    chat_id = call.message.chat.id
-    bot.send_message(chat_id, "Please provide the product ID to delete:")
-    bot.register_next_step_handler(call.message, process_delete_product)
-
-def process_delete_product(message):
-    chat_id = message.chat.id
-    try:
-        product_id = message.text.strip()
-        delete_product(chat_id, product_id)
-    except Exception as e:
-        bot.send_message(chat_id, f"Error processing deletion: {e}")
-
-def view_all_orders(message):
-    try:
-        response = requests.get(f"{API_URL}/orders")
-        logging.info(f"API Response Status: {response.status_code}")
-        logging.info(f"API Response Content: {response.text}")  # Log the raw response
+def call_telegram(chat_id, func, *args, priority=INTERACTIVE, **kwargs):
+    """
+    Makes a Telegram call concerning a chat, e.g. an edit, through the outbound scheduler
+    so that it shares the chat's rate limits and 429 handling, and waits for its result.
+    """
+    if SEND_MODE == "direct":
+        return func(*args, **kwargs)
+    return scheduler.call(chat_id, func, *args, priority=priority, **kwargs).result()
 
-        if response.status_code == 200:
-            orders = response.json()
-            logging.info(f"Parsed Orders: {orders}")  # Log the parsed data
+# Flask app for handling webhooks
+app = Flask(__name__)
 
-            if not orders:  # If no data
-                bot.send_message(message.chat.id, "No orders found.")
-                return
+# "async" acknowledges Telegram as soon as the update is queued and processes it on
+# the ingestion workers; "sync" processes the update before responding.
+WEBHOOK_MODE = os.environ.get("WEBHOOK_MODE", "async")
 
-            message_text = "📋 **All Orders**:\n\n"
-            for order in orders:
-                message_text += f"- Order ID: {order['id']}\n"
-                message_text += f"  Product ID: {order['product_id']}\n"
-                message_text += f"  Quantity: {order['quantity']}\n"
-                message_text += f"  Order Date: {order['order_date']}\n\n"
+def process_update(json_data):
+    with correlation(json_data.get("update_id")):
+        with stage_seconds.time(stage="de_json"):
+            update = telebot.types.Update.de_json(json_data)
+        with stage_seconds.time(stage="dispatch"):
+            bot.process_new_updates([update])
 
-            bot.send_message(message, message_text, parse_mode="Markdown")
-        else:
-            bot.send_message(message, "❌ Failed to fetch orders.")
-    except Exception as e:
-        logging.error(f"Error in view_all_orders: {e}")
-        bot.send_message(message, f"⚠️ Error: {e}")
+ingestion = IngestionPool(process_update, workers=BOT_WORKERS, maxsize=UPDATE_QUEUE_SIZE)
 
-def view_all_ordersByUser(message):
-    try:
-        response = requests.get(f"{API_URL}/orders/{message}")
-        if response.status_code == 200:
-            orders = response.json()
-            if not orders:  # If no data
-                bot.send_message(message.chat.id, "No orders found.")
-                return
-
-            message_text = "📋 **All Orders**:\n\n"
-            for order in orders:
-                message_text += f"- Order ID: {order['id']}\n"
-                message_text += f"  Product ID: {order['product_id']}\n"
-                message_text += f"  Quantity: {order['quantity']}\n"
-                message_text += f"  Order Date: {order['order_date']}\n\n"
-            bot.send_message(message,message_text, parse_mode="Markdown")
-        else:
-            bot.send_message(message,"❌ Failed to fetch orders.")
-    except Exception as e:
-        bot.send_message(message, f"⚠️ Error: {e}")
-
-def place_order(chat_id, order_data):
-    try:
-        response = requests.post(f"{API_URL}/orders", json=order_data)
-        if response.status_code == 201:
-            bot.send_message(chat_id, "✅ Order placed successfully.")
-        else:
-            bot.send_message(chat_id, "❌ Failed to place order.")
+@app.route(f"/{TOKEN}", methods=["POST"])
+def webhook():
+    update_id = None
+    try:
+        json_data = request.get_json(silent=True)
+        if not isinstance(json_data, dict) or not isinstance(json_data.get("update_id"), int):
+            return "Bad Request", 400
+        if deduplicator.is_duplicate(json_data["update_id"]):
+            logging.info("Dropping duplicate update", extra={**SAMPLED, "fields": update_summary(json_data)})
+            return "OK", 200
+        update_id = json_data["update_id"]
+        logging.info("Received update", extra={**SAMPLED, "fields": update_summary(json_data)})
+        if WEBHOOK_MODE == "sync":
+            process_update(json_data)
+        elif not ingestion.submit(json_data):
+            logging.warning(f"Update queue full, shedding update {update_id}")
+            # Telegram will retry the update, which must not be mistaken for a duplicate.
+            deduplicator.forget(update_id)
+            return "Service Unavailable", 503, {"Retry-After": "1"}
+        return "OK", 200
     except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
-
-def delete_orders(chat_id):
-    bot.send_message(chat_id, "Send the Order ID to delete in the format: `/delete_order <order_id>`")
+        logging.error(f"Error processing webhook: {e}")
+        webhook_errors.inc()
+        if update_id is not None:
+            deduplicator.forget(update_id)
+        return "Internal Server Error", 500
 
-@bot.message_handler(commands=["delete_order"])
-def handle_delete_order(message):
-    chat_id = message.chat.id
-    try:
-        order_id = int(message.text.split()[1])
-        response = requests.delete(f"{API_URL}/orders/{order_id}")
-        if response.status_code == 200:
-            bot.send_message(chat_id, f"✅ Order {order_id} deleted successfully.")
-        else:
-            bot.send_message(chat_id, f"❌ Failed to delete order {order_id}.")
-    except (IndexError, ValueError):
-        bot.send_message(chat_id, "Invalid format. Use: `/delete_order <order_id>`.")
-    except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {e}")
+class BlockingIO:
+    """
+    I/O adapter for the shared handlers (see handlers.py) in the Flask mode: every call
+    blocks the worker thread until it is done, so handlers run through run_sync().
+    """
 
-@bot.callback_query_handler(func=lambda call: True)
-def handle_callback(call):
-    chat_id = call.from_user.id
-    existing_role = check_user_role(chat_id)
+    def __init__(self):
+        self.api = BlockingBackend(api)
 
-    if not existing_role:
-        bot.send_message(chat_id, "You do not have a role assigned. Use /start to register.")
-        return
+    async def send(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        send_message(chat_id, text, priority, **kwargs)
 
-    if call.data == "view_all_products":
-        view_all_products(chat_id)
-    elif call.data == "add_new_product":
-        bot.send_message(chat_id, "Please send product details in the format: name,description,price")
-        bot.register_next_step_handler(call.message, handle_add_product)
-    elif call.data == "view_all_orders":
-        view_all_orders(chat_id)
-    elif call.data == "view_all_ordersByUser":
-        view_all_ordersByUser(chat_id)
-    elif call.data == "delete_orders":
-        delete_orders(chat_id)
-    elif call.data == "place_order":
-        bot.send_message(chat_id, "Please send order details in the format: product_id,quantity")
-        bot.register_next_step_handler(call.message, handle_place_order)
-    elif call.data == "start":
-        handle_start(call.message)
-    elif call.data == "help":
-        handle_help(call.message)
-    elif call.data == "info":
-        handle_info(call.message)
+    async def send_now(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        return call_telegram(chat_id, deliver, chat_id, text, priority=priority, **kwargs)
 
-    # Add more handlers as needed
+    async def edit(self, text, chat_id, message_id, priority=INTERACTIVE, **kwargs):
+        return call_telegram(chat_id, bot.edit_message_text, text, chat_id, message_id, priority=priority, **kwargs)
 
-def handle_add_product(message):
-    chat_id = message.chat.id
-    try:
-        name, description, price = message.text.split(",")
-        product_data = {"name": name.strip(), "description": description.strip(), "price": float(price.strip()), "created_by": chat_id}
-        add_new_product(chat_id, product_data)
-    except ValueError:
-        bot.send_message(chat_id, "Invalid format. Use: name,description,price.")
+    async def answer_inline(self, query_id, results, **kwargs):
+        return bot.answer_inline_query(query_id, results, **kwargs)
 
-def handle_place_order(message):
-    chat_id = message.chat.id
-    try:
-        product_id, quantity = message.text.split(",")
-        order_data = {"user_id": chat_id, "product_id": int(product_id.strip()), "quantity": int(quantity.strip())}
-        place_order(chat_id, order_data)
-    except ValueError:
-        bot.send_message(chat_id, "Invalid format. Use: product_id,quantity.")
+    async def get_file(self, file_id):
+        return bot.get_file(file_id)
 
-@bot.callback_query_handler(func=lambda call: call.data == "help")
-@bot.message_handler(commands=["help"])
-def handle_help(message_or_call):
-    # Determine whether the trigger is a message or a callback
-    chat_id = message_or_call.message.chat.id if hasattr(message_or_call, "message") else message_or_call.chat.id
-    role = check_user_role(chat_id)
+    def file_url(self, file_path):
+        return (telebot.apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(TOKEN, file_path)
 
-    if role:
-        help_text = (
-            f"🛠️ **Bot Commands for {role}**:\n\n"
-            "/start - Initialize your account or reset your role.\n"
-            "/help - Show this help message.\n"
-            "/info - Get information about this bot.\n\n"
-            "🎛️ **Menu Options**:\n"
-            "1. **View All Products** - View all products stored in the database.\n"
-        )
-        if role in ["Admin", "Moderator"]:
-            help_text += (
-                "2. **Add New Product** - Add a new product to the database.\n"
-                "3. **Update Product** - Update an existing product's details.\n"
-            )
-        if role == "Admin":
-            help_text += "4. **Delete Product** - Remove a product from the database.\n"
-        if role in ["User", "Moderator", "Admin"]:
-            help_text += (
-                "5. **Place an Order** - Place an order for a product.\n"
-                "6. **View My Orders** - Check your order history.\n"
-            )
+    async def blocking(self, func, *args):
+        return func(*args)
 
-        bot.send_message(chat_id, help_text, parse_mode="Markdown")
-    else:
-        bot.send_message(chat_id, "You do not have a role assigned yet. Use /start to register your role.")
+    def call_from_thread(self, coro):
+        return run_sync(coro)
 
-@bot.callback_query_handler(func=lambda call: call.data == "info")
-@bot.message_handler(commands=["info"])
-def handle_info(message):
-    chat_id = message.chat.id
-    role = check_user_role(chat_id)
+handlers = Handlers(BlockingIO())
+register(bot, handlers, synchronous)
+# Deliver whatever a previous run left in the outbox.
+outbox.start()
 
-    info_text = (
-        "🤖 **Bot Information**:\n\n"
-        "This bot is designed to help you manage your database efficiently through an interactive Telegram interface. "
-        "You can perform actions such as viewing products, placing orders, and managing data based on your role.\n\n"
-        "🔑 **Role-Based Features**:\n"
-        "- **Admin**: Full control of products and orders.\n"
-        "- **Moderator**: Limited management capabilities.\n"
-        "- **User**: Place orders and view products.\n\n"
-        "📡 **Powered By**:\n"
-        "- Flask Framework\n"
-        "- Telebot Library\n"
-        "- RESTful API for data operations\n\n"
-        "💡 **Developer**:\n"
-        "Created by [Your Name]. For queries or issues, contact: [Your Contact Info]."
-    )
-    bot.send_message(chat_id, info_text, parse_mode="Markdown", reply_markup=get_main_menu(role))
+# Public base URL of this app, used by /setwebhook (replace with your hosted domain).
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "https://telegrambot-ckm4.onrender.com")
 
-@bot.message_handler(func=lambda message: True)  # Catches any unrecognized command or input
-def handle_unknown_command(message):
-    bot.send_message(
-        message.chat.id,
-        f"🚫 Sorry, I didn't understand that command.\n"
-        "Type /help to see the list of available commands or use the menu options below.",
-        reply_markup=get_main_menu('')
-    )
+# RUN_MODE=polling fetches updates with getUpdates instead of receiving them on the
+# webhook, for local runs and hosts without a public HTTPS endpoint. Updates go through
+# the same ingestion pool; the Flask app keeps serving / and /metrics.
+RUN_MODE = os.environ.get("RUN_MODE", "webhook")
+poller = PollingRunner(
+    TOKEN,
+    ingestion.submit,
+    batch_size=int(os.environ.get("POLL_BATCH_SIZE", 100)),
+    timeout=int(os.environ.get("POLL_TIMEOUT", 30)),
+    is_duplicate=deduplicator.is_duplicate,
+)
 
 @app.route("/setwebhook", methods=["GET"])
 def set_webhook():
     try:
-        webhook_url = f"https://telegrambot-ckm4.onrender.com/{TOKEN}"  # Replace with your hosted domain
-        bot.remove_webhook()
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{TOKEN}"
+        if bot.get_webhook_info().url == webhook_url:
+            return "Webhook already set.", 200
+        # set_webhook replaces any existing webhook, so there is no need to remove it first.
         bot.set_webhook(url=webhook_url)
-        logging.info(f"Webhook set to {webhook_url}")
+        logging.info(f"Webhook set to {WEBHOOK_URL}")
         return "Webhook set successfully!", 200
     except Exception as e:
         logging.error(f"Error setting webhook: {e}")
         return "Failed to set webhook.", 500
 
+# Queue depths and error counters of this mode's components (the shared ones are
+# registered in services), read from their stats() at scrape time.
+registry.sampled("bot_update_queue_depth", "Updates waiting for an ingestion worker.", ingestion.depth)
+registry.sampled("bot_send_queue_depth", "Messages waiting in the outbound scheduler.", scheduler.depth)
+registry.sampled("bot_updates_total", "Updates seen by the ingestion pool, by outcome.",
+                 lambda: {key: value for key, value in ingestion.stats().items() if key in ("accepted", "rejected", "failed")},
+                 type="counter", label="outcome")
+registry.sampled("bot_messages_total", "Outbound messages, by outcome.",
+                 lambda: {key: value for key, value in scheduler.stats().items() if key in ("sent", "coalesced", "rate_limited", "failed")},
+                 type="counter", label="outcome")
+registry.sampled("bot_backend_circuit_state", "Backend circuit breaker state (0 closed, 1 half-open, 2 open).",
+                 lambda: {group: {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[breaker.state] for group, breaker in api.breakers.items()},
+                 label="group")
+registry.sampled("bot_backend_circuit_rejected_total", "Backend requests failed fast by an open circuit breaker.",
+                 lambda: {group: breaker.rejected for group, breaker in api.breakers.items()},
+                 type="counter", label="group")
+registry.sampled("bot_polling", "Long-polling runner counters (RUN_MODE=polling).",
+                 lambda: {key: value for key, value in poller.stats().items() if key != "offset"}, label="stat")
+registry.sampled("bot_backend_connections", "Backend connection pool usage.",
+                 lambda: {key: value for key, value in api.stats().items() if key in ("in_flight", "connections_opened", "connections_idle")},
+                 label="state")
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/", methods=["GET"])
 def index():
-    logging.info("Root endpoint hit - bot is running")
+    logging.info("Root endpoint hit - bot is running", extra=SAMPLED)
     return "Telegram Bot is running!", 200
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    if RUN_MODE == "polling":
+        # Telegram refuses getUpdates while a webhook is set.
+        bot.remove_webhook()
+        poller.start()
     logging.info(f"Starting Flask app on port {port}")
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,153 @@
+import csv
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Rows sent to the backend per batch, and how many requests of a batch run at once.
+BATCH_SIZE = 50
+CONCURRENCY = 4
+
+# Errors listed in the final report; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_product(fields, chat_id):
+    """
+    Validates a 'name,description,price' record.
+    :raises ValueError: If the record does not match the schema.
+    :return: Payload for POST /products.
+    """
+    name, description, price = fields
+    if not name.strip():
+        raise ValueError("name is empty")
+    return {"name": name.strip(), "description": description.strip(), "price": float(price.strip()), "created_by": chat_id}
+
+
+def parse_order(fields, chat_id):
+    """
+    Validates a 'product_id,quantity' record.
+    :raises ValueError: If the record does not match the schema.
+    :return: Payload for POST /orders.
+    """
+    product_id, quantity = fields
+    return {"user_id": chat_id, "product_id": int(product_id.strip()), "quantity": int(quantity.strip())}
+
+
+# Import kinds: (header, row parser, backend path).
+SCHEMAS = {
+    "products": (("name", "description", "price"), parse_product, "/products"),
+    "orders": (("product_id", "quantity"), parse_order, "/orders"),
+}
+
+
+def detect_kind(first_row):
+    """
+    Picks the schema of a CSV file from its header row, or from its column count.
+    :return: Tuple of (kind, whether the first row is a header), or (None, False).
+    """
+    normalised = tuple(field.strip().lower() for field in first_row)
+    for kind, (header, _, _) in SCHEMAS.items():
+        if normalised == header:
+            return kind, True
+    for kind, (header, _, _) in SCHEMAS.items():
+        if len(first_row) == len(header):
+            return kind, False
+    return None, False
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    def error(self, line, reason):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def summary(self, finished=False):
+        elapsed = time.monotonic() - self.started
+        status = "✅ Import finished" if finished else "⏳ Importing"
+        text = (
+            f"{status} ({self.kind}): {self.rows} rows read, "
+            f"{self.succeeded} saved, {self.failed} failed in {elapsed:.0f}s."
+        )
+        if finished and self.errors:
+            text += "\n\nErrors:\n" + "\n".join(self.errors)
+            if self.failed > len(self.errors):
+                text += f"\n… and {self.failed - len(self.errors)} more."
+        return text
+
+
+def import_csv(lines, chat_id, post, on_progress=None, kind=None, allowed_kinds=None):
+    """
+    Streams a CSV document row by row and sends the records to the backend in batches
+    of concurrent requests, so memory use does not grow with the file size.
+    :param lines: Iterable of text lines (e.g. a streamed file).
+    :param post: Callable invoked as post(path, json=payload), returning a requests.Response.
+    :param on_progress: Optional callable receiving the ImportReport after every batch.
+    :param kind: 'products' or 'orders'; detected from the first row if omitted.
+    :param allowed_kinds: Kinds the caller may import; all kinds if omitted.
+    :raises PermissionError: If the file is of a kind the caller may not import.
+    :return: The final ImportReport, or None if the file matches no schema.
+    """
+    reader = csv.reader(lines)
+    first_row = next(reader, None)
+    if first_row is None:
+        return None
+    detected, has_header = detect_kind(first_row)
+    kind = kind or detected
+    if kind is None:
+        return None
+    if allowed_kinds is not None and kind not in allowed_kinds:
+        raise PermissionError(f"importing {kind} is not allowed for your role")
+    _, parse, path = SCHEMAS[kind]
+    report = ImportReport(kind)
+
+    def send(item):
+        line, payload = item
+        try:
+            response = post(path, json=payload)
+            if response.status_code in (200, 201):
+                return line, None
+            return line, f"HTTP {response.status_code}"
+        except Exception as e:
+            return line, str(e)
+
+    def flush(batch):
+        for line, reason in executor.map(send, batch):
+            if reason is None:
+                report.succeeded += 1
+            else:
+                report.error(line, reason)
+        if on_progress:
+            on_progress(report)
+
+    rows = reader if has_header else _prepend(first_row, reader)
+    batch = []
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        for row in rows:
+            if not any(field.strip() for field in row):
+                continue
+            report.rows += 1
+            try:
+                batch.append((reader.line_num, parse(row, chat_id)))
+            except ValueError as e:
+                report.error(reader.line_num, f"invalid record ({e})")
+            if len(batch) >= BATCH_SIZE:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    logging.info(f"CSV import of {kind} for {chat_id}: {report.succeeded} saved, {report.failed} failed")
+    return report
+
+
+def _prepend(row, rows):
+    yield row
+    yield from rows
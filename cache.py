@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by TTLCache.get when a key is absent or expired, so that a cached
+# ``None`` (a negative result) can be told apart from a miss.
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache whose entries expire after a time-to-live.
+    :param maxsize: Maximum number of entries kept; the least recently used entry is evicted first.
+    :param ttl: Default lifetime of an entry in seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Looks up a key, refreshing its LRU position on a hit.
+        :return: The cached value, or MISSING if the key is absent or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores a value, evicting the least recently used entries when full.
+        :param ttl: Lifetime in seconds for this entry; defaults to the cache TTL.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        :return: Dictionary with hit/miss/eviction counters and the current size.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "hit_rate": self.hits / total if total else 0.0,
+            }
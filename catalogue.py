@@ -0,0 +1,173 @@
+import threading
+import time
+import logging
+from views import render_products_page
+
+
+class ProductCatalogue:
+    """
+    Process-wide cache of the product catalogue shared by all users.
+    Products are indexed by id and rendered pages are cached until the next write.
+    Concurrent misses are collapsed into a single backend fetch. If a refresh fails, the
+    last catalogue that was loaded keeps being served and is_stale() reports it.
+    :param fetch: Callable returning the full product list, or None if the backend failed.
+    :param ttl: Seconds after which the catalogue is re-fetched to pick up changes made outside the bot.
+    :param on_load: Optional callable invoked with every freshly loaded product list, e.g. to build a search index.
+    """
+
+    def __init__(self, fetch, ttl=60.0, on_load=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.on_load = on_load
+        self._products = {}
+        self._ordered = None
+        self._pages = {}
+        self._loaded_at = None
+        self._available = False
+        self._loading = None
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.hits = 0
+        self.misses = 0
+
+    def is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def is_stale(self):
+        """
+        :return: True if the catalogue being served is older than the TTL or was invalidated.
+        """
+        return self._available and not self.is_fresh()
+
+    def _install(self, products):
+        # Called with the lock held.
+        self._products = {product["id"]: product for product in products}
+        self._ordered = None
+        self._pages.clear()
+        self._loaded_at = time.monotonic()
+        self._available = True
+
+    def _ensure_loaded(self):
+        """
+        Loads the catalogue if it is missing or expired. Only one thread fetches;
+        the others wait for its result.
+        :return: True if a catalogue, possibly stale, is available.
+        """
+        with self._lock:
+            if self.is_fresh():
+                self.hits += 1
+                return True
+            self.misses += 1
+            loading = self._loading
+            if loading is None:
+                loading = self._loading = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            loading.wait()
+            with self._lock:
+                return self._available
+
+        try:
+            products = self.fetch()
+        except Exception as e:
+            logging.error(f"Error fetching product catalogue: {e}")
+            products = None
+        with self._lock:
+            self.fetches += 1
+            if products is not None:
+                self._install(products)
+            self._loading = None
+            available = self._available
+        # Runs before waiting threads are released, so they see a consistent index.
+        if products is not None and self.on_load is not None:
+            try:
+                self.on_load(products)
+            except Exception as e:
+                logging.error(f"Error in catalogue load hook: {e}")
+        loading.set()
+        return available
+
+    def _product_list(self):
+        # Called with the lock held.
+        if self._ordered is None:
+            self._ordered = list(self._products.values())
+        return self._ordered
+
+    def products(self):
+        """
+        :return: List of all products, or None if the catalogue could not be loaded.
+        """
+        if not self._ensure_loaded():
+            return None
+        with self._lock:
+            return self._product_list()
+
+    def page(self, offset, limit):
+        """
+        Returns a rendered catalogue page, reusing the pre-rendered text when possible.
+        :return: Tuple of (text, has_more, offset), or None if the catalogue could not be loaded.
+        """
+        if not self._ensure_loaded():
+            return None
+        return self.cached_page(offset, limit)
+
+    def cached_page(self, offset, limit):
+        """
+        Like page(), but never fetches; serves whatever catalogue is cached.
+        The offset comes from callback data, so it is clamped to the start of a page within the
+        catalogue; that keeps the number of cached pages bounded by the catalogue size.
+        :return: Tuple of (text, has_more, offset) where offset is that of the page served,
+                 or None if nothing has been loaded yet.
+        """
+        with self._lock:
+            if not self._available:
+                return None
+            offset = min(max(offset, 0), max(len(self._products) - 1, 0)) // limit * limit
+            cached = self._pages.get((offset, limit))
+            if cached is not None:
+                return cached
+            products = self._product_list()
+            total = len(products)
+            page = (render_products_page(products[offset:offset + limit], offset, total), offset + limit < total, offset)
+            self._pages[(offset, limit)] = page
+            return page
+
+    def upsert(self, product):
+        """
+        Writes a created or updated product through to the cache.
+        """
+        with self._lock:
+            if not self._available:
+                return
+            existing = self._products.get(product["id"])
+            self._products[product["id"]] = {**existing, **product} if existing else product
+            self._ordered = None
+            self._pages.clear()
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._products.pop(product_id, None) is not None:
+                self._ordered = None
+                self._pages.clear()
+
+    def invalidate(self):
+        """
+        Marks the cached catalogue as expired so the next read re-fetches it.
+        """
+        with self._lock:
+            self._loaded_at = None
+            self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "products": len(self._products),
+                "pages": len(self._pages),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "stale": self.is_stale(),
+            }
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Seconds between sweeps of expired entries. Reads already ignore expired entries; the
+# sweeps, run from set(), only stop abandoned conversations from accumulating.
+PURGE_INTERVAL = 60.0
+
+
+class MemoryStateStore:
+    """
+    In-process conversation state, keyed by chat id.
+    Each entry records the name of the step waiting for the chat's next message,
+    plus JSON-serialisable data for that step, and expires after a TTL.
+    :param ttl: Seconds a pending step stays valid.
+    :param purge_interval: Minimum seconds between sweeps of expired entries.
+    """
+
+    def __init__(self, ttl=600.0, purge_interval=PURGE_INTERVAL):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._states = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.monotonic() + purge_interval
+
+    def set(self, chat_id, step, data=None):
+        with self._lock:
+            self._states[chat_id] = (step, data or {}, time.time() + self.ttl)
+            purge = time.monotonic() >= self._next_purge
+            if purge:
+                self._next_purge = time.monotonic() + self.purge_interval
+        if purge:
+            self.purge_expired()
+
+    def get(self, chat_id):
+        """
+        :return: Tuple of (step, data), or None if the chat has no pending step.
+        """
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                return None
+            if state[2] <= time.time():
+                del self._states[chat_id]
+                return None
+            return state[0], state[1]
+
+    def pop(self, chat_id):
+        """
+        Atomically claims and removes the pending step of a chat.
+        :return: Tuple of (step, data), or None if the chat has no pending step.
+        """
+        with self._lock:
+            state = self._states.pop(chat_id, None)
+        if state is None or state[2] <= time.time():
+            return None
+        return state[0], state[1]
+
+    def clear(self, chat_id):
+        with self._lock:
+            self._states.pop(chat_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for chat_id in [key for key, state in self._states.items() if state[2] <= now]:
+                del self._states[chat_id]
+
+
+class SQLiteStateStore:
+    """
+    Conversation state persisted in SQLite, so pending steps survive restarts and are
+    shared by every worker process on the host. Lookups go through the primary key.
+    :param path: Path of the database file.
+    :param ttl: Seconds a pending step stays valid.
+    :param purge_interval: Minimum seconds between sweeps of expired rows by this process.
+    """
+
+    def __init__(self, path, ttl=600.0, purge_interval=PURGE_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._next_purge = time.monotonic() + purge_interval
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_state ("
+                "chat_id INTEGER PRIMARY KEY, step TEXT NOT NULL, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def set(self, chat_id, step, data=None):
+        with self._connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO conversation_state (chat_id, step, data, expires_at) VALUES (?, ?, ?, ?)",
+                (chat_id, step, json.dumps(data or {}), time.time() + self.ttl),
+            )
+        with self._purge_lock:
+            purge = time.monotonic() >= self._next_purge
+            if purge:
+                self._next_purge = time.monotonic() + self.purge_interval
+        if purge:
+            self.purge_expired()
+
+    def get(self, chat_id):
+        row = self._connection().execute(
+            "SELECT step, data FROM conversation_state WHERE chat_id = ? AND expires_at > ?",
+            (chat_id, time.time()),
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def pop(self, chat_id):
+        with self._connection() as db:
+            row = db.execute(
+                "DELETE FROM conversation_state WHERE chat_id = ? RETURNING step, data, expires_at",
+                (chat_id,),
+            ).fetchone()
+        if row is None or row[2] <= time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def clear(self, chat_id):
+        with self._connection() as db:
+            db.execute("DELETE FROM conversation_state WHERE chat_id = ?", (chat_id,))
+
+    def purge_expired(self):
+        with self._connection() as db:
+            db.execute("DELETE FROM conversation_state WHERE expires_at <= ?", (time.time(),))
+
+
+class ShardedStateStore:
+    """
+    Spreads chats over several stores by chat id, e.g. one SQLite file per shard.
+    :param stores: The shard stores.
+    """
+
+    def __init__(self, stores):
+        self.stores = stores
+
+    def _store(self, chat_id):
+        return self.stores[hash(chat_id) % len(self.stores)]
+
+    def set(self, chat_id, step, data=None):
+        self._store(chat_id).set(chat_id, step, data)
+
+    def get(self, chat_id):
+        return self._store(chat_id).get(chat_id)
+
+    def pop(self, chat_id):
+        return self._store(chat_id).pop(chat_id)
+
+    def clear(self, chat_id):
+        self._store(chat_id).clear(chat_id)
+
+    def purge_expired(self):
+        for store in self.stores:
+            store.purge_expired()
+
+
+def make_state_store(spec, ttl=600.0, shards=1, purge_interval=PURGE_INTERVAL):
+    """
+    Creates a conversation state store from a spec string.
+    :param spec: 'memory', or 'sqlite:<path>' for a file-backed store.
+    :param shards: Number of SQLite files to spread chats over.
+    :param purge_interval: Minimum seconds between sweeps of expired entries.
+    """
+    if spec == "memory":
+        return MemoryStateStore(ttl, purge_interval)
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        if shards <= 1:
+            return SQLiteStateStore(path, ttl, purge_interval)
+        root, ext = os.path.splitext(path)
+        return ShardedStateStore([SQLiteStateStore(f"{root}.{index}{ext}", ttl, purge_interval) for index in range(shards)])
+    raise ValueError(f"Unknown conversation store: {spec}")
@@ -0,0 +1,52 @@
+import threading
+from collections import deque
+
+
+class UpdateDeduplicator:
+    """
+    Remembers the most recently seen update_ids so re-delivered updates can be dropped.
+    A ring buffer keeps insertion order for eviction and a set gives O(1) membership;
+    memory grows linearly with the window size (roughly 100 bytes per id).
+    :param window: Number of recent update_ids to remember.
+    """
+
+    def __init__(self, window=10000):
+        self.window = window
+        self._order = deque()
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def is_duplicate(self, update_id):
+        """
+        Records an update_id and reports whether it was already in the window.
+        :return: True if the update has been seen before and should be dropped.
+        """
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return True
+            if len(self._order) >= self.window:
+                self._seen.discard(self._order.popleft())
+            self._order.append(update_id)
+            self._seen.add(update_id)
+            return False
+
+    def forget(self, update_id):
+        """
+        Removes an update_id recorded by is_duplicate(), for an update that was not
+        processed after all (shed or failed), so that Telegram's retry is accepted.
+        """
+        with self._lock:
+            if update_id not in self._seen:
+                return
+            self._seen.discard(update_id)
+            # Usually the id just recorded, so check the newest end before scanning.
+            if self._order[-1] == update_id:
+                self._order.pop()
+            else:
+                self._order.remove(update_id)
+
+    def stats(self):
+        with self._lock:
+            return {"window": self.window, "size": len(self._order), "duplicates": self.duplicates}
@@ -0,0 +1,715 @@
+"""
+Update handlers shared by the Flask mode (bot.py) and the asyncio mode (async_bot.py).
+
+The handlers are coroutines that do all of their I/O through an adapter supplied by the
+entry point, so the same code serves both modes:
+
+    io.api                      backend client whose get/post/request are coroutines
+    io.send(chat_id, text, ...) sends (or queues) a message
+    io.send_now(chat_id, text)  sends a message and returns it
+    io.edit(text, chat_id, message_id, ...)
+
+Messages and edits take priority=INTERACTIVE or BULK (see sender) and are rate limited
+per chat in both modes.
+    io.answer_inline(query_id, results, ...)
+    io.get_file(file_id)
+    io.file_url(file_path)      download URL of a file returned by get_file
+    io.blocking(func, *args)    runs blocking work such as a SQLite write or a catalogue reload
+    io.call_from_thread(coro)   runs a coroutine from a background thread and returns its result
+
+In the Flask mode every adapter method completes without suspending, and run_sync()
+drives a handler to completion on the calling thread; in the asyncio mode the handlers
+are awaited on the event loop.
+"""
+import os
+import io
+import logging
+import time
+import functools
+import requests
+import telebot
+from backend import api as blocking_api, CircuitOpenError, endpoint_label
+from bulk_import import import_csv, parse_order, parse_product
+from cache import MISSING
+from concurrent.futures import ThreadPoolExecutor
+from logsetup import SAMPLED, hash_value
+from router import CallbackRouter, PUBLIC
+from search import INLINE_PAGE_SIZE
+from sender import BULK, INTERACTIVE
+from views import (
+    BACKEND_UNAVAILABLE_TEXT, INFO_TEXT, MAIN_MENUS, STALE_NOTICE, PAGE_SIZE,
+    inline_product_result, pagination_keyboard, render_help, render_order_stats, render_orders_page, slice_page,
+)
+from services import (
+    ROLE_CACHE_NEGATIVE_TTL, WRITE_DELIVERED, analytics, catalogue, conversations, last_known_roles, outbox,
+    record_write, role_cache, search_index, stage_seconds, stale_reads,
+)
+from outbox import describe
+
+# Roles allowed to use each callback. None means any registered role; PUBLIC also
+# lets users without a role through (they are the ones who need /start and /help).
+ADMIN = {"admin"}
+STAFF = {"admin", "moderator"}
+
+# Seconds Telegram may cache an inline answer; short, since the catalogue changes.
+INLINE_CACHE_TIME = int(os.environ.get("INLINE_CACHE_TIME", 10))
+
+# Imports run off the update workers so a large file does not hold up other chats.
+import_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("IMPORT_WORKERS", 2)))
+
+# Seconds between edits of the import progress message.
+IMPORT_PROGRESS_INTERVAL = 2.0
+
+# Names of the handlers that can receive the next message of a conversation.
+CONVERSATION_STEPS = set()
+
+
+def conversation_step(func):
+    """
+    Registers a handler that can receive the next message of a conversation.
+    """
+    CONVERSATION_STEPS.add(func.__name__)
+    return func
+
+
+def run_sync(coro):
+    """
+    Runs a handler coroutine to completion on the calling thread. With a blocking I/O
+    adapter nothing is ever awaited on an event loop, so the coroutine finishes on its
+    first step.
+    :return: The coroutine's return value.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("Handler suspended outside an event loop; its I/O adapter must not block asynchronously")
+
+
+class BlockingBackend:
+    """
+    Exposes a blocking backend.BackendClient through the coroutine interface the handlers use.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def request(self, method, path, **kwargs):
+        return self.client.request(method, path, **kwargs)
+
+    async def get(self, path, **kwargs):
+        return self.client.get(path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return self.client.post(path, **kwargs)
+
+
+def get_main_menu(role):
+    """
+    Returns the main menu inline keyboard for the user's role.
+    The menus are built and JSON-encoded once at startup (see views.MAIN_MENUS).
+    :param role: The role of the user (e.g., 'admin', 'moderator', 'user'), in any case.
+    :return: Pre-encoded markup tailored to the user's role, or None if the role is unknown.
+    """
+    if not role:
+        return None
+    menu = MAIN_MENUS.get(str(role).lower())
+    if menu is None:
+        logging.warning(f"No main menu for role: {role!r}")
+    return menu
+
+
+def last_known_role(chat_id):
+    """
+    Falls back to the last role the backend confirmed for a user while it is unreachable.
+    :return: The stale role, or None if the user was never seen.
+    """
+    role = last_known_roles.get(chat_id)
+    if role is MISSING:
+        return None
+    stale_reads.inc(source="role")
+    return role
+
+
+class Handlers:
+    """
+    The bot's handlers, bound to one I/O adapter (see the module docstring).
+    """
+
+    def __init__(self, io):
+        self.io = io
+        # Whether each listing endpoint honours offset/limit, learnt from its responses (see fetch_page).
+        self.paged_endpoints = {}
+        self.callbacks = CallbackRouter()
+        self.callbacks.add("view_all_products", lambda call: self.view_all_products(call.from_user.id))
+        self.callbacks.add("page:products", lambda call, offset: self.view_all_products(call.from_user.id, int(offset), call.message.message_id))
+        self.callbacks.add("add_new_product", self.prompt_add_product, roles=STAFF)
+        self.callbacks.add("update_product", self.handle_update_product, roles=STAFF)
+        self.callbacks.add("delete_product", self.handle_delete_product, roles=ADMIN)
+        self.callbacks.add("view_all_orders", lambda call: self.view_all_orders(call.from_user.id), roles=STAFF)
+        self.callbacks.add("page:orders", lambda call, offset: self.view_all_orders(call.from_user.id, int(offset), call.message.message_id), roles=STAFF)
+        self.callbacks.add("view_all_ordersByUser", lambda call: self.view_all_ordersByUser(call.from_user.id))
+        self.callbacks.add("page:myorders", lambda call, offset: self.view_all_ordersByUser(call.from_user.id, int(offset), call.message.message_id))
+        self.callbacks.add("delete_orders", lambda call: self.delete_orders(call.from_user.id), roles=ADMIN)
+        self.callbacks.add("order_stats", lambda call: self.show_order_stats(call.from_user.id), roles=ADMIN)
+        self.callbacks.add("place_order", self.prompt_place_order)
+        self.callbacks.add("start", lambda call: self.handle_start(call.message), roles=PUBLIC)
+        self.callbacks.add("help", lambda call: self.handle_help(call.message), roles=PUBLIC)
+        self.callbacks.add("info", lambda call: self.handle_info(call.message), roles=PUBLIC)
+
+        rejected = {
+            "add_product": "❌ Failed to add product.",
+            "update_product": "❌ Failed to update product {id}.",
+            "delete_product": "❌ Failed to delete product {id}.",
+            "place_order": "❌ Failed to place order.",
+            "delete_order": "❌ Failed to delete order {id}.",
+        }
+        for kind, delivered in WRITE_DELIVERED.items():
+            outbox.on(kind, delivered=delivered, rejected=self.write_rejected(rejected[kind]))
+
+    # Check if user exists and fetch their role
+    async def check_user_role(self, chat_id):
+        with stage_seconds.time(stage="check_user_role"):
+            role = role_cache.get(chat_id)
+            if role is not MISSING:
+                return role
+
+            try:
+                response = await self.io.api.get(f"/users/check/{chat_id}")
+                if response.status_code == 200:
+                    role = response.json()["role"]  # Return the role if the user exists
+                    role_cache.set(chat_id, role)
+                    last_known_roles.set(chat_id, role)
+                    return role
+                elif response.status_code >= 500:
+                    logging.warning(f"Error checking user existence: HTTP {response.status_code}")
+                    return last_known_role(chat_id)
+                else:
+                    logging.warning(f"User not found: {chat_id}")
+                    role_cache.set(chat_id, None, ttl=ROLE_CACHE_NEGATIVE_TTL)
+                    return None
+            except Exception as e:
+                logging.error(f"Error checking user existence: {e}")
+                return last_known_role(chat_id)
+
+    def expect_reply(self, chat_id, step, **data):
+        """
+        Routes the chat's next message to the given conversation step.
+        :param step: The step handler; it is called as step(message, **data).
+        :param data: JSON-serialisable arguments passed to the step.
+        """
+        conversations.set(chat_id, step.__name__, data)
+
+    async def continue_conversation(self, message):
+        state = conversations.pop(message.chat.id)
+        if state is None:  # Claimed by another worker or expired in the meantime
+            return
+        step, data = state
+        if step not in CONVERSATION_STEPS:
+            logging.warning(f"Unknown conversation step: {step!r}")
+            return
+        await getattr(self, step)(message, **data)
+
+    # Process role selection in the bot
+    async def handle_start(self, message):
+        chat_id = message.chat.id
+        role = await self.check_user_role(chat_id)
+
+        if role:
+            # If the user already has a role, show the menu
+            await self.io.send(
+                chat_id,
+                f"Welcome back, {message.from_user.first_name}!\n"
+                f"You are logged in as a '{role}'. Here is your menu:",
+                reply_markup=get_main_menu(role),
+            )
+        else:
+            # If no role exists, prompt the user to select one
+            markup = telebot.types.ReplyKeyboardMarkup(one_time_keyboard=True, resize_keyboard=True)
+            markup.add("User", "Admin", "Moderator")
+            await self.io.send(
+                chat_id,
+                "Hello! Welcome to the Mother Database Management System.\n"
+                "Please select your role to proceed:",
+                reply_markup=markup,
+            )
+            self.expect_reply(chat_id, self.process_role_selection)
+
+    # Function to call the ngrok API to assign a role
+    async def update_role_via_api(self, username, chat_id, new_role):
+        payload = {
+            "username": username,
+            "chat_id": chat_id,
+            "role": new_role
+        }
+        logging.info("Assigning role via API", extra={"fields": {"user": hash_value(chat_id), "role": new_role}})
+
+        try:
+            response = await self.io.api.post("/users/add", json=payload)
+            if response.status_code == 200:
+                role_cache.set(chat_id, new_role)  # Make the new role effective immediately
+                last_known_roles.set(chat_id, new_role)
+                return True
+            else:
+                error_message = response.json().get("error", "Unknown error")
+                logging.error(f"Failed to update/assign role: {error_message}")
+                return False
+        except ValueError:
+            logging.error("Invalid or empty response from the API.")
+            return False
+        except Exception as e:
+            logging.error(f"Error calling the update role API: {e}")
+            return False
+
+    # Process role selection from user input
+    @conversation_step
+    async def process_role_selection(self, message):
+        role = message.text.strip()
+        chat_id = message.from_user.id
+        username = message.from_user.username
+        logging.info("Role selected", extra={"fields": {"user": hash_value(chat_id), "role": role}})
+
+        # Check if the role is valid
+        if role.lower() not in ["user", "admin", "moderator"]:
+            await self.io.send(
+                chat_id,
+                "Invalid role selected. Please try again.",
+                reply_markup=telebot.types.ReplyKeyboardRemove()
+            )
+            return
+
+        # If Admin or Moderator role is selected, verify credentials
+        if role.lower() in ["admin", "moderator"]:
+            await self.io.send(
+                chat_id,
+                f"To verify your credentials for the {role} role, please enter the passcode:"
+            )
+            self.expect_reply(message.chat.id, self.verify_credentials, role=role)
+            return
+
+        # For "User" role, directly assign without credentials
+        if await self.update_role_via_api(username, chat_id, role):
+            await self.io.send(
+                chat_id,
+                f"You have been assigned the '{role}' role. Here is your menu:",
+                reply_markup=get_main_menu(role)
+            )
+        else:
+            await self.io.send(
+                chat_id,
+                "Failed to assign role. Please try again or contact support."
+            )
+
+    # Verify user credentials before assigning admin or moderator roles
+    @conversation_step
+    async def verify_credentials(self, message, role):
+        username = message.from_user.username
+        user_input = message.text.strip()
+        chat_id = message.from_user.id
+        logging.info("Verifying credentials", extra={"fields": {"user": hash_value(chat_id), "role": role}})
+
+        # Example credential checks (replace with actual logic or API calls)
+        if (role.lower() == "admin" and user_input == "admin_passcode") or \
+           (role.lower() == "moderator" and user_input == "moderator_passcode"):
+            if await self.update_role_via_api(username, chat_id, role):
+                await self.io.send(
+                    chat_id,
+                    f"Your credentials are verified. You are now assigned the '{role}' role.",
+                    reply_markup=get_main_menu(role)
+                )
+            else:
+                await self.io.send(
+                    chat_id,
+                    "Failed to assign role. Please contact support."
+                )
+        else:
+            await self.io.send(
+                chat_id,
+                "Invalid credentials. Please try again or contact support."
+            )
+
+    async def show_page(self, chat_id, text, keyboard, message_id=None):
+        """
+        Sends a listing page, or edits the message already showing the listing in place.
+        """
+        if message_id is None:
+            await self.io.send(chat_id, text, parse_mode="Markdown", reply_markup=keyboard)
+            return
+        try:
+            await self.io.edit(text, chat_id, message_id, parse_mode="Markdown", reply_markup=keyboard)
+        except Exception as e:
+            # Telegram refuses an edit that changes nothing, e.g. a double-clicked button.
+            if "message is not modified" not in str(e):
+                raise
+
+    async def view_all_products(self, chat_id, offset=0, message_id=None):
+        try:
+            # A reload blocks on the backend (and on concurrent loads), so it goes through io.blocking.
+            page = await self.io.blocking(catalogue.page, offset, PAGE_SIZE)
+            if page is not None:
+                text, has_more, offset = page
+                if catalogue.is_stale():
+                    stale_reads.inc(source="catalogue")
+                    text = STALE_NOTICE + text
+                await self.show_page(chat_id, text, pagination_keyboard("products", offset, PAGE_SIZE, has_more), message_id)
+            else:
+                await self.io.send(chat_id, "❌ Failed to fetch products.")
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def record_write(self, chat_id, kind, method, path, body=None):
+        """
+        Durably queues a backend write (see services.record_write); the SQLite insert
+        waits for an fsync, so it goes through io.blocking.
+        """
+        return await self.io.blocking(record_write, chat_id, kind, method, path, body)
+
+    def write_rejected(self, text):
+        """
+        Builds an outbox callback telling the user that a queued write was refused.
+        It runs on the flusher thread.
+        """
+        def rejected(entry, result):
+            if entry["chat_id"] is not None:
+                message = f"{text.format(id=entry['path'].rsplit('/', 1)[-1])} ({describe(result)})"
+                self.io.call_from_thread(self.io.send(entry["chat_id"], message))
+        return rejected
+
+    async def add_new_product(self, chat_id, product_data):
+        try:
+            notice = await self.record_write(chat_id, "add_product", "POST", "/products", product_data)
+            await self.io.send(chat_id, "📝 New product received; it will be saved shortly." + notice)
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def update_product(self, chat_id, product_id, updated_data):
+        try:
+            notice = await self.record_write(chat_id, "update_product", "PUT", f"/products/{product_id}", updated_data)
+            await self.io.send(chat_id, f"📝 Update to product {product_id} received; it will be saved shortly." + notice)
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def delete_product(self, chat_id, product_id):
+        try:
+            notice = await self.record_write(chat_id, "delete_product", "DELETE", f"/products/{product_id}")
+            await self.io.send(chat_id, f"📝 Deletion of product {product_id} received; it will be carried out shortly." + notice)
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def handle_update_product(self, call):
+        chat_id = call.message.chat.id
+        await self.io.send(chat_id, "Please provide the product ID and the updated details in the format: product_id,name,description,price")
+        self.expect_reply(chat_id, self.process_update_product)
+
+    @conversation_step
+    async def process_update_product(self, message):
+        chat_id = message.chat.id
+        try:
+            product_id, name, description, price = message.text.split(",")
+            updated_data = {
+                "name": name.strip(),
+                "description": description.strip(),
+                "price": float(price.strip())
+            }
+        except ValueError:
+            await self.io.send(chat_id, "Invalid format. Use: product_id,name,description,price.")
+            return
+        await self.update_product(chat_id, product_id.strip(), updated_data)
+
+    async def handle_delete_product(self, call):
+        chat_id = call.message.chat.id
+        await self.io.send(chat_id, "Please provide the product ID to delete:")
+        self.expect_reply(chat_id, self.process_delete_product)
+
+    @conversation_step
+    async def process_delete_product(self, message):
+        await self.delete_product(message.chat.id, message.text.strip())
+
+    async def fetch_page(self, path, offset, limit):
+        """
+        Fetches one page of a listing from the backend using offset/limit parameters
+        (see views.slice_page). Only a summary of the response is logged, never the payload.
+        :return: Tuple of (items on the page, whether more items follow), or None on failure.
+        """
+        label = endpoint_label(path)
+        started = time.perf_counter()
+        response = await self.io.api.get(path, params={"offset": offset, "limit": limit + 1})
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            logging.warning(f"GET {path} failed: HTTP {response.status_code} in {elapsed_ms:.0f} ms")
+            return None
+        items = response.json()
+        logging.info(f"GET {path}: {len(items)} items, {len(response.content)} bytes in {elapsed_ms:.0f} ms", extra=SAMPLED)
+        paged = self.paged_endpoints.get(label)
+        if len(items) > limit + 1:
+            paged = False
+        elif paged is None and offset and items:
+            # A short response past the first page is either that page or a whole list of
+            # at most limit + 1 items. The first item tells them apart: a backend that pages
+            # returns a different one for offset 0, one that ignores the parameters the same list.
+            probe = await self.io.api.get(path, params={"offset": 0, "limit": 1})
+            if probe.status_code == 200:
+                paged = probe.json() != items
+        if paged is not None:
+            self.paged_endpoints[label] = paged
+        return slice_page(items, offset, limit, paged)
+
+    async def show_orders(self, chat_id, path, kind, title, offset, message_id):
+        try:
+            page = await self.fetch_page(path, offset, PAGE_SIZE)
+            if page is None:
+                await self.io.send(chat_id, "❌ Failed to fetch orders.")
+                return
+
+            orders, has_more = page
+            if not orders:  # If no data
+                await self.io.send(chat_id, "No orders found.")
+                return
+
+            text = render_orders_page(orders, offset, title)
+            await self.show_page(chat_id, text, pagination_keyboard(kind, offset, PAGE_SIZE, has_more), message_id)
+        except CircuitOpenError:
+            await self.io.send(chat_id, BACKEND_UNAVAILABLE_TEXT)
+        except Exception as e:
+            logging.error(f"Error fetching {path}: {e}")
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def view_all_orders(self, chat_id, offset=0, message_id=None):
+        await self.show_orders(chat_id, "/orders", "orders", "All Orders", offset, message_id)
+
+    async def view_all_ordersByUser(self, chat_id, offset=0, message_id=None):
+        await self.show_orders(chat_id, f"/orders/{chat_id}", "myorders", "My Orders", offset, message_id)
+
+    async def place_order(self, chat_id, order_data):
+        try:
+            notice = await self.record_write(chat_id, "place_order", "POST", "/orders", order_data)
+            await self.io.send(chat_id, "📝 Order received; it will be submitted shortly." + notice)
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def show_order_stats(self, chat_id):
+        try:
+            # Seeding downloads the full order list once, through the blocking client.
+            if not analytics.is_seeded() and not await self.io.blocking(analytics.seed):
+                await self.io.send(chat_id, "❌ Failed to fetch orders.")
+                return
+            snapshot = analytics.snapshot()
+            top = {product_id for product_id, _ in snapshot["top_products"]}
+            products = await self.io.blocking(catalogue.products)
+            names = {product["id"]: product.get("name") for product in products or [] if product["id"] in top}
+            await self.io.send(chat_id, render_order_stats(snapshot, names), parse_mode="Markdown")
+        except Exception as e:
+            logging.error(f"Error showing order stats: {e}")
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def delete_orders(self, chat_id):
+        await self.io.send(chat_id, "Send the Order ID to delete in the format: `/delete_order <order_id>`")
+
+    async def handle_delete_order(self, message):
+        chat_id = message.chat.id
+        try:
+            order_id = int(message.text.split()[1])
+        except (IndexError, ValueError):
+            await self.io.send(chat_id, "Invalid format. Use: `/delete_order <order_id>`.")
+            return
+        try:
+            notice = await self.record_write(chat_id, "delete_order", "DELETE", f"/orders/{order_id}")
+            await self.io.send(chat_id, f"📝 Deletion of order {order_id} received; it will be carried out shortly." + notice)
+        except Exception as e:
+            await self.io.send(chat_id, f"⚠️ Error: {e}")
+
+    async def prompt_add_product(self, call):
+        await self.io.send(call.from_user.id, "Please send product details in the format: name,description,price")
+        self.expect_reply(call.message.chat.id, self.handle_add_product)
+
+    async def prompt_place_order(self, call):
+        await self.io.send(call.from_user.id, "Please send order details in the format: product_id,quantity")
+        self.expect_reply(call.message.chat.id, self.handle_place_order)
+
+    async def deny_callback(self, call, role):
+        chat_id = call.from_user.id
+        if role:
+            await self.io.send(chat_id, f"⛔ This option is not available for the '{role}' role.")
+        else:
+            await self.io.send(chat_id, "You do not have a role assigned. Use /start to register.")
+
+    async def handle_callback(self, call):
+        try:
+            await self.callbacks.dispatch(call, self.check_user_role, self.deny_callback)
+        except ValueError:
+            logging.warning(f"Malformed callback data: {call.data!r}")
+
+    async def handle_inline_query(self, query):
+        try:
+            role = await self.check_user_role(query.from_user.id)
+            if not role or await self.io.blocking(catalogue.products) is None:
+                await self.io.answer_inline(query.id, [], cache_time=INLINE_CACHE_TIME, is_personal=True)
+                return
+            offset = int(query.offset) if query.offset.isdigit() else 0
+            with stage_seconds.time(stage="inline_search"):
+                products, next_offset = search_index.search(query.query, offset, INLINE_PAGE_SIZE)
+            await self.io.answer_inline(
+                query.id,
+                [inline_product_result(product) for product in products],
+                cache_time=INLINE_CACHE_TIME,
+                is_personal=True,
+                next_offset=str(next_offset) if next_offset is not None else "",
+            )
+        except Exception as e:
+            logging.error(f"Error answering inline query: {e}")
+
+    @conversation_step
+    async def handle_add_product(self, message):
+        chat_id = message.chat.id
+        try:
+            product_data = parse_product(message.text.split(","), chat_id)
+        except ValueError:
+            await self.io.send(chat_id, "Invalid format. Use: name,description,price.")
+            return
+        await self.add_new_product(chat_id, product_data)
+
+    @conversation_step
+    async def handle_place_order(self, message):
+        chat_id = message.chat.id
+        try:
+            order_data = parse_order(message.text.split(","), chat_id)
+        except ValueError:
+            await self.io.send(chat_id, "Invalid format. Use: product_id,quantity.")
+            return
+        await self.place_order(chat_id, order_data)
+
+    async def handle_document(self, message):
+        chat_id = message.chat.id
+        role = await self.check_user_role(chat_id)
+        if not role:
+            await self.io.send(chat_id, "You do not have a role assigned. Use /start to register.")
+            return
+
+        document = message.document
+        if not (document.file_name or "").lower().endswith(".csv"):
+            await self.io.send(chat_id, "Please upload a .csv file with rows of name,description,price or product_id,quantity.")
+            return
+
+        kind = (message.caption or "").strip().lower() or None
+        if kind not in (None, "products", "orders"):
+            await self.io.send(chat_id, "Unknown import type. Use the caption 'products' or 'orders'.")
+            return
+        progress = await self.io.send_now(chat_id, "⏳ Import queued…")
+        import_executor.submit(self.run_import, chat_id, role, document.file_id, kind, progress.message_id)
+
+    def run_import(self, chat_id, role, file_id, kind, progress_message_id):
+        """
+        Streams an uploaded CSV file into the backend. Runs on import_executor and uses
+        the blocking backend client in both modes.
+        """
+        last_edit = [0.0]
+
+        def show(text, priority=INTERACTIVE):
+            try:
+                self.io.call_from_thread(self.io.edit(text, chat_id, progress_message_id, priority=priority))
+            except Exception as e:
+                if "message is not modified" not in str(e):
+                    logging.error(f"Error updating import progress: {e}")
+
+        def on_progress(report):
+            now = time.monotonic()
+            if now - last_edit[0] >= IMPORT_PROGRESS_INTERVAL:
+                last_edit[0] = now
+                # Progress is bulk output: replies to other chats go first.
+                show(report.summary(), BULK)
+
+        # Product imports are restricted like "Add New Product"; anyone with a role may order.
+        allowed_kinds = ("products", "orders") if role.lower() in STAFF else ("orders",)
+
+        try:
+            file_info = self.io.call_from_thread(self.io.get_file(file_id))
+            with requests.get(self.io.file_url(file_info.file_path), stream=True, timeout=blocking_api.timeout) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                # urllib3 closes a fully read response, which TextIOWrapper reports as reading a closed file.
+                response.raw.auto_close = False
+                lines = io.TextIOWrapper(response.raw, encoding="utf-8-sig", newline="")
+                report = import_csv(lines, chat_id, blocking_api.post, on_progress, kind, allowed_kinds)
+        except Exception as e:
+            logging.error(f"Error importing CSV for {chat_id}: {e}")
+            show(f"⚠️ Import failed: {e}")
+            return
+
+        if report is None:
+            show("❌ Could not recognise the file. Expected name,description,price or product_id,quantity rows.")
+            return
+        if report.kind == "products" and report.succeeded:
+            catalogue.invalidate()
+        elif report.kind == "orders" and report.succeeded:
+            analytics.request_reconcile()
+        show(report.summary(finished=True))
+
+    async def handle_help(self, message):
+        chat_id = message.chat.id
+        role = await self.check_user_role(chat_id)
+
+        if role:
+            await self.io.send(chat_id, render_help(role), parse_mode="Markdown")
+        else:
+            await self.io.send(chat_id, "You do not have a role assigned yet. Use /start to register your role.")
+
+    async def handle_info(self, message):
+        chat_id = message.chat.id
+        role = await self.check_user_role(chat_id)
+
+        await self.io.send(chat_id, INFO_TEXT, parse_mode="Markdown", reply_markup=get_main_menu(role))
+
+    async def handle_unknown_command(self, message):
+        chat_id = message.from_user.id
+        role = await self.check_user_role(chat_id)
+
+        if role:
+            keyboard = get_main_menu(role)
+            if keyboard:
+                await self.io.send(
+                    chat_id,
+                    "Please use the menu options below to interact with the system.",
+                    reply_markup=keyboard
+                )
+            else:
+                await self.io.send(
+                    chat_id,
+                    "Error: Unable to generate menu. Please contact support."
+                )
+        else:
+            await self.io.send(
+                chat_id,
+                "You have not registered a role yet. Use /start to register your role."
+            )
+
+
+def register(bot, handlers, adapt=None):
+    """
+    Registers the handlers on a TeleBot or AsyncTeleBot, in matching order.
+    :param adapt: Optional wrapper applied to every handler, e.g. to run it with run_sync().
+    """
+    adapt = adapt or (lambda handler: handler)
+    # Registered before every other message handler so that a pending step sees the
+    # chat's next message first, commands included.
+    bot.register_message_handler(adapt(handlers.continue_conversation),
+                                 func=lambda message: conversations.get(message.chat.id) is not None)
+    bot.register_message_handler(adapt(handlers.handle_start), commands=["start"])
+    bot.register_message_handler(adapt(handlers.handle_delete_order), commands=["delete_order"])
+    bot.register_callback_query_handler(adapt(handlers.handle_callback), func=lambda call: True)
+    bot.register_inline_handler(adapt(handlers.handle_inline_query), func=lambda query: True)
+    bot.register_message_handler(adapt(handlers.handle_document), content_types=["document"])
+    bot.register_message_handler(adapt(handlers.handle_help), commands=["help"])
+    bot.register_message_handler(adapt(handlers.handle_info), commands=["info"])
+    # Registered after the command handlers so that /help, /info and /delete_order reach them.
+    bot.register_message_handler(adapt(handlers.handle_unknown_command), func=lambda message: True)
+
+
+def synchronous(handler):
+    """
+    Wraps a handler coroutine function for telebot's synchronous TeleBot (see run_sync).
+    """
+    @functools.wraps(handler)
+    def run(*args, **kwargs):
+        return run_sync(handler(*args, **kwargs))
+    return run
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import queue
+import threading
+import logging
+
+# Updates that may wait for a worker before the webhook sheds load with 503.
+UPDATE_QUEUE_SIZE = int(os.environ.get("UPDATE_QUEUE_SIZE", 1000))
+
+
+def update_chat_id(json_data):
+    """
+    Extracts the chat (or user) id an update belongs to, used to keep per-chat ordering.
+    :param json_data: Raw update dictionary as received from Telegram.
+    :return: The chat id, or the update_id if the update is not tied to a chat.
+    """
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if key in json_data:
+            return json_data[key]["chat"]["id"]
+    callback = json_data.get("callback_query")
+    if callback:
+        if callback.get("message"):
+            return callback["message"]["chat"]["id"]
+        return callback["from"]["id"]
+    for value in json_data.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+    return json_data.get("update_id")
+
+
+class IngestionPool:
+    """
+    Bounded pool of worker threads that process raw updates off the request path.
+    Every chat is pinned to one worker, so updates from the same chat are handled
+    in the order they arrived while different chats proceed in parallel.
+    :param process: Callable invoked with each raw update dictionary.
+    :param workers: Number of worker threads.
+    :param maxsize: Total number of updates that may wait in the queues.
+    """
+
+    def __init__(self, process, workers=8, maxsize=1000):
+        self.process = process
+        self.workers = workers
+        self._queues = [queue.Queue(maxsize=max(1, maxsize // workers)) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index, q in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(q,), name=f"update-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logging.info(f"Started {self.workers} update workers")
+
+    def submit(self, json_data):
+        """
+        Enqueues a raw update without blocking.
+        :return: True if the update was queued, False if its queue is full.
+        """
+        if not self._threads:
+            self.start()
+        q = self._queues[hash(update_chat_id(json_data)) % self.workers]
+        try:
+            q.put_nowait(json_data)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "depth": self.depth(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+    def _run(self, q):
+        while True:
+            json_data = q.get()
+            try:
+                self.process(json_data)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Error processing update {json_data.get('update_id')}: {e}")
+            finally:
+                q.task_done()
+
+
+class AsyncIngestion:
+    """
+    asyncio counterpart of IngestionPool: worker tasks drain bounded per-shard queues,
+    keeping updates from the same chat in order.
+    :param process: Coroutine function invoked with each raw update dictionary.
+    :param workers: Number of worker tasks.
+    :param maxsize: Total number of updates that may wait in the queues.
+    """
+
+    def __init__(self, process, workers=64, maxsize=1000):
+        self.process = process
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queues = []
+        self._tasks = []
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Starts the worker tasks; must be called from the running event loop.
+        """
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(maxsize=max(1, self.maxsize // self.workers)) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._run(q)) for q in self._queues]
+        logging.info(f"Started {self.workers} async update workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, json_data):
+        """
+        Enqueues a raw update without waiting.
+        :return: True if the update was queued, False if its queue is full.
+        """
+        if not self._tasks:
+            self.start()
+        q = self._queues[hash(update_chat_id(json_data)) % self.workers]
+        try:
+            q.put_nowait(json_data)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "depth": self.depth(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+    async def _run(self, q):
+        while True:
+            json_data = await q.get()
+            try:
+                await self.process(json_data)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Error processing update {json_data.get('update_id')}: {e}")
+            finally:
+                q.task_done()
@@ -0,0 +1,175 @@
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# "text" keeps the classic one-line format; "json" emits one JSON object per record.
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of high-volume records (those logged with extra=SAMPLED) that are kept.
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+# Records are dropped rather than blocking the caller once this many are waiting.
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+MAX_LOG_FIELD_LENGTH = int(os.environ.get("MAX_LOG_FIELD_LENGTH", 512))
+
+# Marks a record as high-volume so that it is subject to LOG_SAMPLE_RATE.
+SAMPLED = {"sampled": True}
+
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+
+@contextmanager
+def correlation(value):
+    """
+    Tags every record logged inside the block (on this thread or task) with a correlation id.
+    :param value: Identifier of the unit of work, e.g. the update_id.
+    """
+    token = correlation_id.set(value)
+    try:
+        yield
+    finally:
+        correlation_id.reset(token)
+
+
+def hash_value(value):
+    """
+    Returns a short stable digest of a value, so records can be correlated per user
+    without writing chat ids, usernames or message text to the logs.
+    """
+    return hashlib.sha256(str(value).encode()).hexdigest()[:12]
+
+
+def truncate(value, limit=MAX_LOG_FIELD_LENGTH):
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+
+def update_summary(json_data):
+    """
+    Summarises a raw update for logging: its id, its type and a hash of the sender.
+    """
+    kind = next((key for key in json_data if key != "update_id"), None)
+    body = json_data.get(kind) if kind else None
+    sender = body.get("from", {}).get("id") if isinstance(body, dict) else None
+    return {"update_id": json_data.get("update_id"), "type": kind, "user": hash_value(sender) if sender else None}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Drops sampled-out records and attaches the current correlation id. Runs on the
+    calling thread, before the record is queued.
+    """
+
+    def __init__(self, sample_rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, "sampled", False) and random.random() >= self.sample_rate:
+            return False
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON. Structured fields passed as extra={"fields": {...}}
+    are merged into the object; every value is truncated to MAX_LOG_FIELD_LENGTH.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": truncate(record.getMessage()),
+        }
+        if getattr(record, "correlation_id", None) is not None:
+            entry["correlation_id"] = record.correlation_id
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            entry[key] = value if isinstance(value, (int, float, bool)) or value is None else truncate(value)
+        if record.exc_info:
+            entry["exc"] = truncate(self.formatException(record.exc_info), MAX_LOG_FIELD_LENGTH * 8)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def formatMessage(self, record):
+        record.message = truncate(record.message)
+        line = super().formatMessage(record)
+        fields = getattr(record, "fields", None) or {}
+        if fields:
+            line += " " + " ".join(f"{key}={truncate(value)}" for key, value in fields.items())
+        if getattr(record, "correlation_id", None) is not None:
+            line = f"{line} [cid={record.correlation_id}]"
+        return line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks: when the queue is full the record is counted and dropped.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Keep args unmerged and exc_info intact; formatting happens on the listener thread.
+        return record
+
+
+_handler = None
+
+
+def setup_logging(fmt=LOG_FORMAT, level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE):
+    """
+    Routes the root logger through a bounded queue to a background thread that formats
+    and writes the records, so log I/O never runs on the webhook or worker threads.
+    :param fmt: 'json' or 'text'.
+    :return: The DroppingQueueHandler installed on the root logger.
+    """
+    global _handler
+    if _handler is not None:
+        return _handler
+    stream = logging.StreamHandler()
+    stream.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter(sample_rate))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    _handler = handler
+    return handler
+
+
+def stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
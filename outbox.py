@@ -0,0 +1,320 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from backend import endpoint_group
+
+# Entries delivered per flush; each batch is read and marked in one transaction.
+BATCH_SIZE = 20
+# Retry delays grow as BASE_BACKOFF * 2**attempts, capped at MAX_BACKOFF seconds.
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+# An entry that keeps failing with a transient error is given up after this many attempts.
+MAX_ATTEMPTS = 20
+# Delivered and failed entries are kept this many seconds for inspection, then pruned.
+RETENTION = 86400.0
+# Seconds a flusher holds the lease on a group of entries; it is renewed while the
+# group is being delivered, and a crashed process's lease lapses after this long.
+LEASE_SECONDS = 60.0
+
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+
+class Outbox:
+    """
+    Durable, ordered queue of backend writes. A write is appended to SQLite before the
+    user is acknowledged and delivered later by a background flusher, so a backend
+    hiccup or a restart does not lose it. Every entry carries a generated idempotency
+    key, sent as the Idempotency-Key header, so a redelivered write is not applied twice.
+
+    Entries are split into groups by path (e.g. 'orders' and 'products') and delivered
+    in the order they were written within each group. A transient failure (network
+    error, open circuit, 5xx, 408 or 429) backs off only the entry's group and retries
+    the same entry; any other non-2xx response rejects the entry. Several processes may
+    share the database: a flusher delivers a group only while it holds the group's lease.
+    :param path: Path of the SQLite database file.
+    :param send: Callable invoked as send(method, path, json=..., headers=...) returning a response.
+    :param group: Callable mapping a request path to its group, by default its circuit breaker group.
+    """
+
+    def __init__(self, path, send, batch_size=BATCH_SIZE, base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF,
+                 max_attempts=MAX_ATTEMPTS, group=endpoint_group, lease=LEASE_SECONDS):
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.group = group
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.rejected = 0
+        self.retries = 0
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                "kind TEXT NOT NULL, method TEXT NOT NULL, path TEXT NOT NULL, body TEXT, chat_id INTEGER, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, grp TEXT)"
+            )
+            if "grp" not in [row[1] for row in db.execute("PRAGMA table_info(outbox)")]:
+                # Databases written before entries were grouped.
+                db.execute("ALTER TABLE outbox ADD COLUMN grp TEXT")
+            db.executemany("UPDATE outbox SET grp = ? WHERE id = ?",
+                           [(self.group(row[1]), row[0]) for row in db.execute("SELECT id, path FROM outbox WHERE grp IS NULL")])
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_group ON outbox (status, grp, id)")
+            # One row per group: which flusher holds it until when, and when a backed-off group may be retried.
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_lease ("
+                "grp TEXT PRIMARY KEY, owner TEXT, expires_at REAL NOT NULL DEFAULT 0, retry_at REAL NOT NULL DEFAULT 0)"
+            )
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            # An acknowledged write must survive a power loss, not just a crash.
+            db.execute("PRAGMA synchronous=FULL")
+            self._local.db = db
+        return db
+
+    def on(self, kind, delivered=None, rejected=None):
+        """
+        Registers callbacks for a kind of write, invoked on the flusher thread as
+        delivered(entry, response) and rejected(entry, response_or_error).
+        """
+        self._handlers[kind] = (delivered, rejected)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, kind, method, path, body=None, chat_id=None):
+        """
+        Durably records a write and wakes up the flusher.
+        :param kind: Name of the write, selecting the callbacks registered with on().
+        :param body: JSON-serialisable request body.
+        :return: The idempotency key of the entry.
+        """
+        key = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as db:
+            db.execute(
+                "INSERT INTO outbox (idempotency_key, kind, method, path, body, chat_id, status, created_at, updated_at, grp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, method, path, json.dumps(body) if body is not None else None, chat_id, PENDING, now, now,
+                 self.group(path)),
+            )
+        if self._thread is None:
+            self.start()
+        self._wakeup.set()
+        return key
+
+    def _claim_groups(self):
+        """
+        Takes the lease on every group with pending entries that no other flusher holds
+        and that is not backing off. The transaction is IMMEDIATE so that two processes
+        cannot both see a group as free.
+        :return: The claimed groups.
+        """
+        now = time.time()
+        db = self._connection()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            groups = [row[0] for row in db.execute(
+                "SELECT DISTINCT o.grp FROM outbox o LEFT JOIN outbox_lease l ON l.grp = o.grp "
+                "WHERE o.status = ? AND (l.grp IS NULL OR (l.expires_at <= ? AND l.retry_at <= ?))",
+                (PENDING, now, now),
+            )]
+            db.executemany(
+                "INSERT INTO outbox_lease (grp, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (grp) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                [(group, self.owner, now + self.lease) for group in groups],
+            )
+        return groups
+
+    def _renew(self, group):
+        """
+        Extends the lease on a group.
+        :return: False if the lease lapsed and another flusher took the group over.
+        """
+        with self._connection() as db:
+            return db.execute("UPDATE outbox_lease SET expires_at = ? WHERE grp = ? AND owner = ?",
+                              (time.time() + self.lease, group, self.owner)).rowcount == 1
+
+    def _release(self, group, backoff=None):
+        with self._connection() as db:
+            db.execute("UPDATE outbox_lease SET owner = NULL, expires_at = 0, retry_at = ? WHERE grp = ? AND owner = ?",
+                       (time.time() + backoff if backoff is not None else 0.0, group, self.owner))
+
+    def _pending_batch(self, group):
+        rows = self._connection().execute(
+            "SELECT id, idempotency_key, kind, method, path, body, chat_id, attempts FROM outbox "
+            "WHERE status = ? AND grp = ? ORDER BY id LIMIT ?",
+            (PENDING, group, self.batch_size),
+        ).fetchall()
+        return [
+            {"id": row[0], "key": row[1], "kind": row[2], "method": row[3], "path": row[4],
+             "body": json.loads(row[5]) if row[5] is not None else None, "chat_id": row[6], "attempts": row[7]}
+            for row in rows
+        ]
+
+    def _deliver(self, entry):
+        """
+        Sends one entry.
+        :return: Tuple of (status, result) where status is DELIVERED, FAILED or PENDING
+                 (transient failure) and result the response or exception.
+        """
+        kwargs = {"headers": {"Idempotency-Key": entry["key"]}}
+        if entry["body"] is not None:
+            kwargs["json"] = entry["body"]
+        try:
+            response = self.send(entry["method"], entry["path"], **kwargs)
+        except Exception as e:
+            return PENDING, e
+        if 200 <= response.status_code < 300:
+            return DELIVERED, response
+        if response.status_code >= 500 or response.status_code in (408, 429):
+            return PENDING, response
+        return FAILED, response
+
+    def flush(self):
+        """
+        Delivers one batch of pending entries of every group this flusher can claim.
+        :return: Number of entries settled (delivered or rejected).
+        """
+        settled = 0
+        for group in self._claim_groups():
+            backoff = None
+            try:
+                count, backoff = self._flush_group(group)
+                settled += count
+            finally:
+                self._release(group, backoff)
+        return settled
+
+    def _flush_group(self, group):
+        """
+        Delivers one batch of a claimed group in order, stopping at the first transient failure.
+        :return: Tuple of (entries settled, seconds to back the group off or None).
+        """
+        batch = self._pending_batch(group)
+        settled = []
+        backoff = None
+        renew_at = time.monotonic() + self.lease / 2
+        for entry in batch:
+            if time.monotonic() >= renew_at:
+                if not self._renew(group):
+                    logging.warning(f"Outbox lease on {group} lapsed, leaving it to another flusher")
+                    break
+                renew_at = time.monotonic() + self.lease / 2
+            status, result = self._deliver(entry)
+            if status == PENDING and entry["attempts"] + 1 >= self.max_attempts:
+                status = FAILED
+            if status == PENDING:
+                attempts = entry["attempts"] + 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                self.retries += 1
+                with self._connection() as db:
+                    db.execute("UPDATE outbox SET attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                               (attempts, describe(result), time.time(), entry["id"]))
+                logging.warning(f"Outbox delivery of {entry['kind']} failed ({describe(result)}), "
+                                f"retrying {group} in {backoff:.1f}s")
+                break
+            settled.append((entry, status, result))
+
+        if settled:
+            now = time.time()
+            with self._connection() as db:
+                db.executemany(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?",
+                    [(status, None if status == DELIVERED else describe(result), now, entry["id"])
+                     for entry, status, result in settled],
+                )
+            for entry, status, result in settled:
+                self._notify(entry, status, result)
+        return len(settled), backoff
+
+    def _notify(self, entry, status, result):
+        delivered, rejected = self._handlers.get(entry["kind"], (None, None))
+        if status == DELIVERED:
+            self.delivered += 1
+            callback = delivered
+        else:
+            self.rejected += 1
+            logging.error(f"Outbox gave up on {entry['kind']} {entry['key']}: {describe(result)}")
+            callback = rejected
+        if callback is None:
+            return
+        try:
+            callback(entry, result)
+        except Exception as e:
+            logging.error(f"Error in outbox callback for {entry['kind']}: {e}")
+
+    def prune(self):
+        with self._connection() as db:
+            db.execute("DELETE FROM outbox WHERE status != ? AND updated_at < ?", (PENDING, time.time() - RETENTION))
+
+    def _idle_timeout(self):
+        """
+        :return: Seconds until the next backed-off group may be retried, at most 5.
+        """
+        retry_at = self._connection().execute(
+            "SELECT MIN(l.retry_at) FROM outbox_lease l WHERE l.retry_at > ? "
+            "AND EXISTS (SELECT 1 FROM outbox o WHERE o.status = ? AND o.grp = l.grp)",
+            (time.time(), PENDING),
+        ).fetchone()[0]
+        return 5.0 if retry_at is None else min(5.0, retry_at - time.time())
+
+    def _run(self):
+        last_prune = 0.0
+        while True:
+            try:
+                settled = self.flush()
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+                timeout = self._idle_timeout()
+            except Exception as e:
+                logging.error(f"Error flushing outbox: {e}")
+                time.sleep(self.base_backoff)
+                continue
+            if settled == 0:
+                # New entries wake the flusher early; a group that is backing off is skipped until its retry time.
+                self._wakeup.wait(timeout=max(timeout, 0.05))
+                self._wakeup.clear()
+
+    def depth(self):
+        return self._connection().execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def stats(self):
+        return {
+            "pending": self.depth(),
+            "delivered": self.delivered,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
+
+
+def describe(result):
+    if isinstance(result, Exception):
+        return str(result)
+    return f"HTTP {result.status_code}"
@@ -0,0 +1,133 @@
+import threading
+import time
+import logging
+from collections import deque
+from telebot import apihelper
+
+# getUpdates accepts at most 100 updates per call.
+MAX_BATCH_SIZE = 100
+
+
+class PollingRunner:
+    """
+    Long-polling alternative to the webhook. Fetches updates with getUpdates in large
+    batches and hands them to the same pipeline the webhook feeds. The offset that
+    confirms a batch to Telegram is only advanced once every update of the batch has
+    been accepted, so a crash never loses updates that were not handed off yet; when
+    the ingestion queues are full the runner waits instead of dropping updates.
+    :param token: Bot token.
+    :param submit: Callable accepting a raw update dictionary, returning False if it could not be queued.
+    :param batch_size: Updates requested per getUpdates call, at most 100.
+    :param timeout: Long-poll timeout in seconds; Telegram holds the call open this long when idle.
+    :param is_duplicate: Optional callable reporting whether an update_id was already handled.
+    """
+
+    def __init__(self, token, submit, batch_size=MAX_BATCH_SIZE, timeout=30, is_duplicate=None,
+                 backpressure_wait=0.05, error_backoff=1.0, max_error_backoff=30.0):
+        self.token = token
+        self.submit = submit
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.timeout = timeout
+        self.is_duplicate = is_duplicate
+        self.backpressure_wait = backpressure_wait
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self.offset = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._recent = deque()
+        self.batches = 0
+        self.updates = 0
+        self.duplicates = 0
+        self.last_batch_size = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.errors = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="polling", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """
+        Polls until stop() is called. Runs on the calling thread.
+        """
+        self._started_at = time.monotonic()
+        backoff = self.error_backoff
+        logging.info(f"Polling for updates in batches of up to {self.batch_size}")
+        while not self._stop.is_set():
+            try:
+                batch = apihelper.get_updates(
+                    self.token, offset=self.offset, limit=self.batch_size,
+                    timeout=10, long_polling_timeout=self.timeout,
+                )
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logging.error(f"Error polling for updates: {e}, retrying in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(self.max_error_backoff, backoff * 2)
+                continue
+            backoff = self.error_backoff
+            if batch:
+                self._hand_off(batch)
+
+    def _hand_off(self, batch):
+        duplicates = 0
+        for update in batch:
+            if self.is_duplicate is not None and self.is_duplicate(update["update_id"]):
+                duplicates += 1
+                continue
+            waited = None
+            while not self.submit(update):
+                # The ingestion queues are full: hold the batch (and its offset) until they drain.
+                if waited is None:
+                    waited = time.monotonic()
+                if self._stop.wait(self.backpressure_wait):
+                    return
+            if waited is not None:
+                with self._lock:
+                    self.backpressure_waits += 1
+                    self.backpressure_seconds += time.monotonic() - waited
+        # Every update is queued; the next getUpdates call confirms them to Telegram.
+        self.offset = batch[-1]["update_id"] + 1
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.updates += len(batch)
+            self.duplicates += duplicates
+            self.last_batch_size = len(batch)
+            self._recent.append((now, len(batch)))
+            while self._recent and now - self._recent[0][0] > 10:
+                self._recent.popleft()
+
+    def stats(self):
+        """
+        :return: Dictionary with batch and backpressure counters and the update rate
+                 over the last ten seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(count for at, count in self._recent if now - at <= 10)
+            window = min(10.0, now - self._started_at) if self._started_at else 0.0
+            return {
+                "batches": self.batches,
+                "updates": self.updates,
+                "duplicates": self.duplicates,
+                "last_batch_size": self.last_batch_size,
+                "mean_batch_size": self.updates / self.batches if self.batches else 0.0,
+                "updates_per_s": recent / window if window > 0 else 0.0,
+                "backpressure_waits": self.backpressure_waits,
+                "backpressure_seconds": self.backpressure_seconds,
+                "errors": self.errors,
+                "offset": self.offset,
+            }
@@ -0,0 +1,73 @@
+import inspect
+import logging
+
+# Marker for routes that may be used without a registered role.
+PUBLIC = "public"
+
+
+class CallbackRouter:
+    """
+    Dispatch table mapping callback_data prefixes to handlers and the roles allowed to use them.
+    callback_data has the form 'name' or 'name:arg:...'; the longest registered prefix wins,
+    so 'page:products:40' is routed to 'page:products' with the argument '40'.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def add(self, prefix, handler, roles=None):
+        """
+        Registers a handler for a callback_data prefix.
+        :param handler: Coroutine function invoked as handler(call, *args).
+        :param roles: Lower-case role names allowed to use the route, None for any registered
+                      role, or PUBLIC for users without a role.
+        """
+        self._routes[prefix] = (handler, frozenset(roles) if roles not in (None, PUBLIC) else roles,
+                                inspect.signature(handler))
+
+    def resolve(self, data):
+        """
+        Finds the route for a callback_data string.
+        :return: Tuple of (handler, roles, args), or None if nothing matches.
+        :raises ValueError: If the handler does not take the number of arguments in the data.
+        """
+        parts = data.split(":")
+        for end in range(len(parts), 0, -1):
+            route = self._routes.get(":".join(parts[:end]))
+            if route is not None:
+                handler, roles, signature = route
+                args = parts[end:]
+                try:
+                    signature.bind(None, *args)
+                except TypeError:
+                    raise ValueError(f"Expected arguments {signature} for {data!r}") from None
+                return handler, roles, args
+        return None
+
+    async def dispatch(self, call, get_role, deny):
+        """
+        Routes a callback query to its handler after checking the caller's role.
+        :param get_role: Coroutine function returning the role for a chat id, or None.
+        :param deny: Coroutine function invoked as deny(call, role) when the caller is not allowed.
+        :return: True if a handler was found.
+        """
+        resolved = self.resolve(call.data or "")
+        if resolved is None:
+            logging.warning(f"No handler for callback data: {call.data!r}")
+            return False
+
+        handler, roles, args = resolved
+        if roles != PUBLIC:
+            role = await get_role(call.from_user.id)
+            if not allowed(roles, role):
+                await deny(call, role)
+                return True
+        await handler(call, *args)
+        return True
+
+
+def allowed(roles, role):
+    """
+    :return: True if a user with `role` may use a route restricted to `roles`.
+    """
+    return roles == PUBLIC or (bool(role) and (roles is None or role.lower() in roles))
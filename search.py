@@ -0,0 +1,202 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import OrderedDict
+
+# Results returned per inline-query page; Telegram accepts at most 50.
+INLINE_PAGE_SIZE = 20
+
+# Prefixes covering more tokens than this (typically one or two letters, typed at the
+# start of every search) have their merged id sets cached, up to BROAD_CACHE_SIZE of them.
+BROAD_PREFIX_TOKENS = 64
+BROAD_CACHE_SIZE = 8
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [token.casefold() for token in _TOKEN.findall(str(text or ""))]
+
+
+class ProductIndex:
+    """
+    In-memory inverted index over product names and descriptions for inline search.
+    Tokens are kept in a sorted list, so every token starting with a prefix is found
+    with two bisections; the ids of all products containing a token are kept in a set.
+    Results are ordered by product id, which keeps pages stable between keystrokes.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._tokens = []
+        self._products = {}
+        self._ids = []
+        self._broad = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, products):
+        """
+        Replaces the index with the given product list.
+        """
+        postings = {}
+        indexed = {}
+        for product in products:
+            indexed[product["id"]] = product
+            for token in self._product_tokens(product):
+                postings.setdefault(token, set()).add(product["id"])
+        with self._lock:
+            self._postings = postings
+            self._tokens = sorted(postings)
+            self._products = indexed
+            self._ids = sorted(indexed, key=_sort_key)
+            self._broad.clear()
+
+    def sync(self, products):
+        """
+        Brings the index in line with a reloaded product list, re-indexing only the
+        products that were added, changed or removed since the last load, so a periodic
+        reload that changes nothing costs one comparison per product. Falls back to
+        build() when most of the list changed.
+        :return: Number of products re-indexed or removed.
+        """
+        with self._lock:
+            indexed = dict(self._products)
+        fresh = {product["id"]: product for product in products}
+        changed = [product for product_id, product in fresh.items() if indexed.get(product_id) != product]
+        removed = [product_id for product_id in indexed if product_id not in fresh]
+        if not indexed or len(changed) + len(removed) > len(fresh) // 2:
+            self.build(products)
+            return len(fresh)
+        if changed or removed:
+            with self._lock:
+                self._broad.clear()
+                for product_id in removed:
+                    self._remove(product_id)
+                for product in changed:
+                    # Replaced rather than merged: the reloaded product is complete.
+                    self._remove(product["id"])
+                    self._upsert(product)
+        return len(changed) + len(removed)
+
+    @staticmethod
+    def _product_tokens(product):
+        return set(tokenize(product.get("name"))) | set(tokenize(product.get("description")))
+
+    def upsert(self, product):
+        """
+        Adds a product, or re-indexes it after an update. Fields missing from
+        `product` are kept from the indexed version.
+        """
+        with self._lock:
+            self._broad.clear()
+            self._upsert(product)
+
+    def _upsert(self, product):
+        # Called with the lock held.
+        existing = self._products.get(product["id"])
+        if existing is not None:
+            self._unindex(existing)
+            product = {**existing, **product}
+        else:
+            bisect.insort(self._ids, product["id"], key=_sort_key)
+        self._products[product["id"]] = product
+        for token in self._product_tokens(product):
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            ids.add(product["id"])
+
+    def remove(self, product_id):
+        with self._lock:
+            self._broad.clear()
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        # Called with the lock held.
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        self._unindex(product)
+        index = bisect.bisect_left(self._ids, _sort_key(product_id), key=_sort_key)
+        if index < len(self._ids) and self._ids[index] == product_id:
+            del self._ids[index]
+
+    def _unindex(self, product):
+        # Called with the lock held.
+        for token in self._product_tokens(product):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(product["id"])
+            if not ids:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _matching(self, prefix):
+        # Called with the lock held. Ids of products with a token starting with `prefix`.
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + "\U0010ffff", start)
+        if end - start == 1:
+            return self._postings[self._tokens[start]]
+        if end - start <= BROAD_PREFIX_TOKENS:
+            return set().union(*(self._postings[token] for token in self._tokens[start:end]))
+        matched = self._broad.get(prefix)
+        if matched is None:
+            matched = self._broad[prefix] = set().union(*(self._postings[token] for token in self._tokens[start:end]))
+            if len(self._broad) > BROAD_CACHE_SIZE:
+                self._broad.popitem(last=False)
+        else:
+            self._broad.move_to_end(prefix)
+        return matched
+
+    def search(self, query, offset=0, limit=INLINE_PAGE_SIZE):
+        """
+        Finds products with, for every word of the query, a name or description
+        token starting with that word.
+        :return: Tuple of (products on the page, offset of the next page or None).
+        """
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        with self._lock:
+            if not terms:
+                page_ids = self._ids[offset:offset + limit + 1]
+            else:
+                # The longest terms are usually the most selective.
+                matched = None
+                for term in terms:
+                    ids = self._matching(term)
+                    matched = ids if matched is None else matched & ids
+                    if not matched:
+                        return [], None
+                page_ids = self._page(matched, offset, limit + 1)
+            products = [self._products[product_id] for product_id in page_ids[:limit]]
+        return products, (offset + limit if len(page_ids) > limit else None)
+
+    def _page(self, matched, offset, count):
+        # Called with the lock held. Reading a dense match off the id-ordered product
+        # list visits about needed * products / matches ids before the page is full;
+        # a sparse match is cheaper to select directly.
+        needed = offset + count
+        if needed * len(self._ids) > len(matched) ** 2:
+            return heapq.nsmallest(needed, matched, key=_sort_key)[offset:]
+        page_ids = []
+        skipped = 0
+        for product_id in self._ids:
+            if product_id in matched:
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page_ids.append(product_id)
+                if len(page_ids) == count:
+                    break
+        return page_ids
+
+    def stats(self):
+        with self._lock:
+            return {"products": len(self._products), "tokens": len(self._tokens)}
+
+
+def _sort_key(product_id):
+    # Backends may use int or str ids; order numbers numerically and before strings.
+    return (0, product_id, "") if isinstance(product_id, int) else (1, 0, str(product_id))
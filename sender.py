@@ -0,0 +1,258 @@
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+# Priority lanes: interactive replies are always sent before bulk output.
+INTERACTIVE = 0
+BULK = 1
+
+# Telegram rejects text messages longer than this.
+MAX_MESSAGE_LENGTH = 4096
+
+# Per-chat buckets are pruned once this many chats have been seen.
+MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """
+        :return: Seconds until a token is available, 0 if one is available now.
+        """
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendScheduler:
+    """
+    Outbound message scheduler that keeps the bot within Telegram's rate limits.
+    Messages are queued per chat and sent by background threads, limited by a global
+    token bucket and one bucket per chat. Interactive messages go before bulk ones,
+    consecutive plain messages to the same chat are coalesced into one, and a 429
+    response pauses sending for the `retry_after` Telegram asks for. Other calls to
+    Telegram, such as message edits, can be queued with call() to share the same limits.
+    :param send: Callable used to deliver a message, called as send(chat_id, text, **kwargs).
+    :param global_rate: Messages per second across all chats.
+    :param chat_rate: Messages per second to a single chat.
+    :param chat_burst: Messages a single chat may receive back to back.
+    :param workers: Number of sender threads.
+    """
+
+    def __init__(self, send, global_rate=30.0, chat_rate=1.0, chat_burst=3, workers=4):
+        self.send = send
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._pending = {}
+        self._lanes = (deque(), deque())
+        self._chat_lane = {}
+        self._in_flight = set()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._threads = []
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"sender-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        """
+        Queues a message for delivery without waiting for Telegram.
+        :param priority: INTERACTIVE or BULK.
+        :param kwargs: Extra arguments for send_message (parse_mode, reply_markup, ...).
+        """
+        if not self._threads:
+            self.start()
+        self._enqueue(chat_id, priority, (text, kwargs, None, None))
+
+    def call(self, chat_id, func, *args, priority=INTERACTIVE, **kwargs):
+        """
+        Queues any Telegram call concerning a chat, e.g. an edit or a send whose result is
+        needed, behind the chat's other messages. It is never coalesced.
+        :return: Future resolved with the call's result, or its exception other than a 429.
+        """
+        if not self._threads:
+            self.start()
+        future = Future()
+        self._enqueue(chat_id, priority, (None, kwargs, (func, args), future))
+        return future
+
+    def _enqueue(self, chat_id, priority, item):
+        with self._cond:
+            self._pending.setdefault(chat_id, deque()).append(item)
+            self._schedule(chat_id, priority)
+            self._cond.notify()
+
+    def _schedule(self, chat_id, priority):
+        # Called with the lock held. Puts the chat in a lane unless it is already
+        # waiting in one (upgrading it if a more urgent message arrived) or being sent.
+        if chat_id in self._in_flight:
+            self._chat_lane[chat_id] = min(priority, self._chat_lane.get(chat_id, priority))
+            return
+        lane = self._chat_lane.get(chat_id)
+        if lane is None:
+            self._chat_lane[chat_id] = priority
+            self._lanes[priority].append(chat_id)
+        elif priority < lane:
+            self._lanes[lane].remove(chat_id)
+            self._chat_lane[chat_id] = priority
+            self._lanes[priority].append(chat_id)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_batch(self):
+        # Called with the lock held. Returns (chat_id, messages) or the seconds to wait.
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        soonest = None
+        for lane in self._lanes:
+            for _ in range(len(lane)):
+                chat_id = lane[0]
+                wait = self._chat_bucket(chat_id).delay(now)
+                if wait <= 0:
+                    break
+                lane.rotate(-1)
+                soonest = wait if soonest is None else min(soonest, wait)
+            else:
+                continue
+            wait = self._global.delay(now)
+            if wait > 0:
+                return wait
+            lane.popleft()
+            self._global.consume()
+            self._chat_bucket(chat_id).consume()
+            self._in_flight.add(chat_id)
+            return chat_id, self._coalesce(self._pending[chat_id])
+        return soonest
+
+    def _coalesce(self, queue):
+        # Merges consecutive plain messages that share their options; only the last one
+        # of a merged group may carry a keyboard. Queued calls are taken one at a time.
+        item = queue.popleft()
+        text, kwargs, call, future = item
+        if call is not None:
+            return item
+        merged = [text]
+        length = len(text)
+        while queue and "reply_markup" not in kwargs:
+            next_text, next_kwargs, next_call, _ = queue[0]
+            if next_call is not None:
+                break
+            options = {key: value for key, value in next_kwargs.items() if key != "reply_markup"}
+            if options != kwargs or length + len(next_text) + 2 > MAX_MESSAGE_LENGTH:
+                break
+            queue.popleft()
+            merged.append(next_text)
+            length += len(next_text) + 2
+            kwargs = next_kwargs
+            self.coalesced += 1
+        return "\n\n".join(merged), kwargs, None, None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                while not isinstance(batch, tuple):
+                    self._cond.wait(batch)
+                    batch = self._next_batch()
+            chat_id, item = batch
+            text, kwargs, call, future = item
+            outcome, retry_after = "sent", None
+            try:
+                if call is None:
+                    self.send(chat_id, text, **kwargs)
+                else:
+                    func, args = call
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                # The sync and asyncio flavours of telebot raise different ApiTelegramException classes.
+                if getattr(e, "error_code", None) == 429:
+                    outcome = "rate_limited"
+                    retry_after = ((getattr(e, "result_json", None) or {}).get("parameters") or {}).get("retry_after", 1)
+                    logging.warning(f"Rate limited by Telegram, pausing sends for {retry_after}s")
+                else:
+                    outcome = "failed"
+                    if future is not None:
+                        # The caller decides, e.g. an edit that changed nothing is not an error.
+                        future.set_exception(e)
+                    else:
+                        logging.error(f"Error sending message to {chat_id}: {e}")
+            else:
+                if future is not None:
+                    future.set_result(result)
+            self._finish(chat_id, item, outcome, retry_after)
+
+    def _finish(self, chat_id, item, outcome, retry_after):
+        with self._cond:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self._in_flight.discard(chat_id)
+            queue = self._pending[chat_id]
+            if retry_after is not None:
+                queue.appendleft(item)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            priority = self._chat_lane.pop(chat_id)
+            if queue:
+                self._schedule(chat_id, priority)
+            else:
+                del self._pending[chat_id]
+                if len(self._chat_buckets) > MAX_IDLE_BUCKETS:
+                    self._prune_buckets()
+            self._cond.notify_all()
+
+    def _prune_buckets(self):
+        # Called with the lock held. Forgets chats that are idle and fully refilled.
+        now = time.monotonic()
+        for chat_id in [key for key, bucket in self._chat_buckets.items()
+                        if key not in self._pending and bucket.is_full(now)]:
+            del self._chat_buckets[chat_id]
+
+    def depth(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._pending.values())
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+        }
@@ -0,0 +1,185 @@
+"""
+Process-wide components shared by the Flask mode (bot.py) and the asyncio mode
+(async_bot.py): the role caches, conversation store, update deduplicator, product
+catalogue and search index, write outbox and order analytics. Nothing here starts a
+thread on import; each entry point starts the components it uses.
+"""
+import os
+import logging
+from backend import api, CLOSED, endpoint_group
+from cache import TTLCache
+from catalogue import ProductCatalogue
+from conversation import make_state_store
+from dedup import UpdateDeduplicator
+from metrics import registry
+from outbox import Outbox
+from search import ProductIndex
+from sender import SendScheduler
+from analytics import OrderAnalytics
+from views import QUEUED_NOTICE
+import logsetup
+
+# Load Telegram Bot Token from environment variables
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+if not TOKEN:
+    raise ValueError("Error: TELEGRAM_BOT_TOKEN environment variable is not set.")
+
+# Time spent in each stage of handling an update, exported on /metrics.
+stage_seconds = registry.histogram(
+    "bot_stage_seconds", "Time spent per update-handling stage.", labels=("stage",))
+
+# Replies are queued on an outbound scheduler that respects Telegram's per-chat and
+# global rate limits; SEND_MODE=direct sends them inline on the handler instead.
+SEND_MODE = os.environ.get("SEND_MODE", "scheduled")
+
+def make_scheduler(deliver):
+    """
+    Creates the outbound scheduler of an entry point.
+    :param deliver: Callable sending one message, called as deliver(chat_id, text, **kwargs) on the sender threads.
+    """
+    return SendScheduler(
+        deliver,
+        global_rate=float(os.environ.get("SEND_GLOBAL_RATE", 30)),
+        chat_rate=float(os.environ.get("SEND_CHAT_RATE", 1)),
+        chat_burst=int(os.environ.get("SEND_CHAT_BURST", 3)),
+        workers=int(os.environ.get("SEND_WORKERS", 4)),
+    )
+
+# Role lookups are cached so that every button press does not cost a round-trip
+# to /users/check. Unknown users are cached for a shorter time so that a user who
+# registers through another client is picked up quickly.
+ROLE_CACHE_TTL = float(os.environ.get("ROLE_CACHE_TTL", 300))
+ROLE_CACHE_NEGATIVE_TTL = float(os.environ.get("ROLE_CACHE_NEGATIVE_TTL", 10))
+role_cache = TTLCache(maxsize=int(os.environ.get("ROLE_CACHE_SIZE", 10000)), ttl=ROLE_CACHE_TTL)
+# The last role the backend confirmed for each user, served while /users is unreachable.
+last_known_roles = TTLCache(maxsize=int(os.environ.get("ROLE_CACHE_SIZE", 10000)),
+                            ttl=float(os.environ.get("ROLE_STALE_TTL", 86400)))
+stale_reads = registry.counter(
+    "bot_stale_reads_total", "Reads served from last known good data while the backend failed.", labels=("source",))
+
+# Multi-step flows remember which step is waiting for the chat's next message in a
+# pluggable store (CONVERSATION_STORE=memory or sqlite:<path>), so that a pending step
+# survives restarts and can be picked up by any worker process. Steps nobody answers
+# are swept out every CONVERSATION_PURGE_INTERVAL seconds.
+conversations = make_state_store(
+    os.environ.get("CONVERSATION_STORE", "memory"),
+    ttl=float(os.environ.get("CONVERSATION_TTL", 600)),
+    shards=int(os.environ.get("CONVERSATION_SHARDS", 1)),
+    purge_interval=float(os.environ.get("CONVERSATION_PURGE_INTERVAL", 60)),
+)
+
+# Telegram re-delivers updates it did not get a timely answer for; remember recent
+# update_ids so a retried "place order" does not create a second order.
+deduplicator = UpdateDeduplicator(window=int(os.environ.get("DEDUP_WINDOW", 10000)))
+
+def fetch_products():
+    response = api.get("/products")
+    if response.status_code != 200:
+        logging.warning(f"Failed to fetch products: HTTP {response.status_code}")
+        return None
+    return response.json()
+
+# Every user shares one cached copy of the catalogue. The bot's own writes update it
+# directly; the TTL picks up changes made through other clients.
+# Inline queries ("@bot term") are answered from a search index that is synced with
+# every catalogue load (only changed products are re-indexed) and updated by the bot's
+# own writes, so typing costs no backend calls.
+search_index = ProductIndex()
+catalogue = ProductCatalogue(fetch_products, ttl=float(os.environ.get("CATALOGUE_TTL", 60)), on_load=search_index.sync)
+
+def product_key(product_id):
+    """
+    Normalises a product id typed by a user to the type used by the backend.
+    """
+    product_id = str(product_id).strip()
+    return int(product_id) if product_id.isdigit() else product_id
+
+def fetch_orders():
+    response = api.get("/orders")
+    if response.status_code != 200:
+        logging.warning(f"Failed to fetch orders: HTTP {response.status_code}")
+        return None
+    return response.json()
+
+# Sales aggregates for the admins' "Order Stats", seeded from /orders on first use and
+# then kept current by the bot's own order writes (see order_placed/order_deleted).
+analytics = OrderAnalytics(fetch_orders, reconcile_interval=float(os.environ.get("ANALYTICS_RECONCILE_INTERVAL", 3600)))
+
+# Order and product writes are recorded in a local SQLite outbox and acknowledged as
+# soon as they are durable; a background flusher delivers them to the backend with an
+# Idempotency-Key header, retrying with backoff while it is unreachable. Writes are
+# ordered and backed off per breaker group, so an outage of /products does not hold up
+# orders. The flusher uses the blocking client in both modes.
+outbox = Outbox(os.environ.get("OUTBOX_PATH", "outbox.db"), api.request)
+
+def record_write(chat_id, kind, method, path, body=None):
+    """
+    Durably queues a backend write for the outbox flusher.
+    :return: Notice to append to the acknowledgement, non-empty if the backend is known to be down.
+    """
+    outbox.enqueue(kind, method, path, body, chat_id)
+    breaker = api.breakers.get(endpoint_group(path))
+    return QUEUED_NOTICE if breaker is not None and breaker.state != CLOSED else ""
+
+def product_added(entry, response):
+    try:
+        created = response.json()
+    except ValueError:
+        created = None
+    if isinstance(created, dict) and "id" in created:
+        # The backend may answer with just the new id; the fields come from the request.
+        product = {**entry["body"], **created}
+        catalogue.upsert(product)
+        search_index.upsert(product)
+    else:
+        catalogue.invalidate()
+
+def product_updated(entry, response):
+    product = {"id": product_key(entry["path"].rsplit("/", 1)[-1]), **entry["body"]}
+    catalogue.upsert(product)
+    search_index.upsert(product)
+
+def product_deleted(entry, response):
+    product_id = product_key(entry["path"].rsplit("/", 1)[-1])
+    catalogue.remove(product_id)
+    search_index.remove(product_id)
+
+def order_placed(entry, response):
+    try:
+        created = response.json()
+    except ValueError:
+        created = None
+    analytics.order_placed({**entry["body"], **created} if isinstance(created, dict) else entry["body"])
+
+def order_deleted(entry, response):
+    analytics.order_deleted(int(entry["path"].rsplit("/", 1)[-1]))
+
+# Callbacks run on the flusher thread once the backend accepted a write; the entry
+# points add the "rejected" callbacks that tell the user (see handlers.Handlers).
+WRITE_DELIVERED = {
+    "add_product": product_added,
+    "update_product": product_updated,
+    "delete_product": product_deleted,
+    "place_order": order_placed,
+    "delete_order": order_deleted,
+}
+
+def catalogue_hit_rate():
+    stats = catalogue.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+# Queue depths, cache efficiency and error counters are read from the components'
+# own stats() at scrape time, so they cost nothing on the request path.
+registry.sampled("bot_duplicate_updates_total", "Redelivered updates dropped by the deduplicator.",
+                 lambda: deduplicator.stats()["duplicates"], type="counter")
+registry.sampled("bot_cache_hit_rate", "Hit rate of the in-process caches.",
+                 lambda: {"role": role_cache.stats()["hit_rate"], "catalogue": catalogue_hit_rate()}, label="cache")
+registry.sampled("bot_log_records", "Log records waiting for the writer thread, and records dropped.",
+                 logsetup.stats, label="state")
+registry.sampled("bot_outbox_pending", "Backend writes waiting in the outbox.", outbox.depth)
+registry.sampled("bot_outbox_writes_total", "Outbox writes settled, by outcome.",
+                 lambda: {key: value for key, value in outbox.stats().items() if key != "pending"},
+                 type="counter", label="outcome")
+registry.sampled("bot_order_analytics", "Orders and products tracked by the order analytics.",
+                 analytics.stats, label="stat")
@@ -0,0 +1,69 @@
+import pytest
+
+import backend
+from backend import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(backend.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("orders", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.stats() == {"state": OPEN, "failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("orders", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_probes_and_closes_on_success(clock):
+    breaker = CircuitBreaker("orders", failure_threshold=1, reset_timeout=30, half_open_probes=1)
+    breaker.record_failure()
+    clock[0] += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    clock[0] += 1
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("orders", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 30
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_open_circuit_error_is_a_connection_error():
+    assert issubclass(CircuitOpenError, backend.requests.ConnectionError)
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import services
+from catalogue import ProductCatalogue
+from search import ProductIndex
+
+PRODUCTS = [{"id": 1, "name": "Widget", "description": "Blue", "price": 9.5}]
+
+
+class Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def test_added_product_is_rendered_from_the_request_when_the_backend_returns_only_its_id(monkeypatch):
+    catalogue = ProductCatalogue(lambda: [dict(product) for product in PRODUCTS])
+    index = ProductIndex()
+    monkeypatch.setattr(services, "catalogue", catalogue)
+    monkeypatch.setattr(services, "search_index", index)
+    assert catalogue.page(0, 10) is not None
+
+    body = {"name": "Gadget", "description": "Red", "price": 2.0}
+    services.product_added({"body": body, "path": "/products"}, Response({"id": 2}))
+
+    text, has_more, _ = catalogue.page(0, 10)
+    assert "Gadget" in text and "Red" in text and "2.0" in text
+    assert not has_more
+    assert index.search("gadget")[0] == [{"id": 2, **body}]
+
+
+def test_page_offsets_are_clamped_to_page_boundaries():
+    catalogue = ProductCatalogue(lambda: [{"id": n, "name": f"Product {n}", "description": "", "price": 1.0} for n in range(25)])
+    assert catalogue.page(-10, 10) == catalogue.page(0, 10)
+    assert catalogue.page(13, 10) == catalogue.page(10, 10)
+    text, has_more, offset = catalogue.page(1000, 10)
+    assert (offset, has_more) == (20, False)
+    assert "Product 24" in text
+    assert catalogue.stats()["pages"] == 3
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from outbox import Outbox
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def json(self):
+        return {}
+
+
+class Backend:
+    """
+    Records the writes it receives and answers each path with the next scripted status (200 once exhausted).
+    """
+
+    def __init__(self, **statuses):
+        self.statuses = {path: list(codes) for path, codes in statuses.items()}
+        self.sent = []
+
+    def __call__(self, method, path, json=None, headers=None):
+        self.sent.append((method, path, json, headers["Idempotency-Key"]))
+        codes = self.statuses.get(path)
+        return Response(codes.pop(0) if codes else 200)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # enqueue() starts the background flusher; the tests flush by hand instead.
+    monkeypatch.setattr(Outbox, "start", lambda self: None)
+    return str(tmp_path / "outbox.db")
+
+
+def test_delivers_entries_in_order(db_path):
+    backend = Backend()
+    outbox = Outbox(db_path, backend)
+    keys = [outbox.enqueue("place_order", "POST", "/orders", {"n": n}) for n in range(3)]
+
+    assert outbox.flush() == 3
+    assert [body["n"] for _, _, body, _ in backend.sent] == [0, 1, 2]
+    assert [key for *_, key in backend.sent] == keys
+    assert outbox.depth() == 0
+    assert outbox.flush() == 0
+
+
+def test_transient_failure_retries_the_same_entry_with_the_same_key(db_path):
+    backend = Backend(**{"/orders": [503]})
+    outbox = Outbox(db_path, backend, base_backoff=0.01)
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 0})
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 1})
+
+    assert outbox.flush() == 0
+    assert len(backend.sent) == 1
+    assert outbox.stats()["retries"] == 1
+
+    time.sleep(0.05)
+    assert outbox.flush() == 2
+    assert [body["n"] for _, _, body, _ in backend.sent] == [0, 0, 1]
+    assert backend.sent[0][3] == backend.sent[1][3]
+
+
+def test_backoff_holds_up_only_the_failing_group(db_path):
+    backend = Backend(**{"/products": [503]})
+    outbox = Outbox(db_path, backend, base_backoff=60)
+    outbox.enqueue("add_product", "POST", "/products", {"name": "A"})
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 0})
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 1})
+
+    assert outbox.flush() == 2
+    assert outbox.depth() == 1
+    backend.sent.clear()
+    assert outbox.flush() == 0
+    assert backend.sent == []
+
+
+def test_rejected_entry_is_reported_and_not_retried(db_path):
+    backend = Backend(**{"/orders": [400]})
+    outbox = Outbox(db_path, backend)
+    delivered, rejected = [], []
+    outbox.on("place_order", delivered=lambda entry, response: delivered.append(entry["body"]),
+              rejected=lambda entry, result: rejected.append((entry["body"], result.status_code)))
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 0}, chat_id=42)
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 1}, chat_id=42)
+
+    assert outbox.flush() == 2
+    assert rejected == [({"n": 0}, 400)]
+    assert delivered == [{"n": 1}]
+    assert outbox.stats() == {"pending": 0, "delivered": 1, "rejected": 1, "retries": 0}
+
+
+def test_gives_up_after_max_attempts(db_path):
+    backend = Backend(**{"/orders": [503, 503]})
+    outbox = Outbox(db_path, backend, base_backoff=0.001, max_attempts=2)
+    rejected = []
+    outbox.on("place_order", rejected=lambda entry, result: rejected.append(result.status_code))
+    outbox.enqueue("place_order", "POST", "/orders", {"n": 0})
+
+    assert outbox.flush() == 0
+    time.sleep(0.01)
+    assert outbox.flush() == 1
+    assert rejected == [503]
+    assert outbox.depth() == 0
+
+
+def test_a_group_leased_by_another_process_is_not_sent(db_path):
+    backend = Backend()
+    first = Outbox(db_path, backend)
+    second = Outbox(db_path, backend)
+    first.enqueue("place_order", "POST", "/orders", {"n": 0})
+
+    assert first._claim_groups() == ["orders"]
+    assert second.flush() == 0
+    assert backend.sent == []
+
+    first._release("orders")
+    assert second.flush() == 1
+    assert len(backend.sent) == 1
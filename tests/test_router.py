@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from router import PUBLIC, CallbackRouter
+
+
+class Call:
+    def __init__(self, data):
+        self.data = data
+
+
+def make_router(calls):
+    async def page(call, offset):
+        calls.append(("page", offset))
+
+    async def menu(call):
+        calls.append(("menu",))
+
+    router = CallbackRouter()
+    router.add("page:products", page, roles=PUBLIC)
+    router.add("menu", menu, roles=PUBLIC)
+    return router
+
+
+def dispatch(router, data):
+    return asyncio.run(router.dispatch(Call(data), None, None))
+
+
+def test_longest_prefix_wins_and_passes_the_rest_as_arguments():
+    calls = []
+    router = make_router(calls)
+    assert dispatch(router, "page:products:40")
+    assert dispatch(router, "menu")
+    assert calls == [("page", "40"), ("menu",)]
+    assert not dispatch(router, "page:orders:0")
+
+
+@pytest.mark.parametrize("data", ["page:products", "page:products:1:2", "menu:1"])
+def test_wrong_argument_count_is_malformed(data):
+    calls = []
+    with pytest.raises(ValueError):
+        dispatch(make_router(calls), data)
+    assert calls == []
@@ -0,0 +1,66 @@
+from search import ProductIndex
+
+PRODUCTS = [
+    {"id": 1, "name": "Blue widget", "description": "Small and sturdy", "price": 1.0},
+    {"id": 2, "name": "Red widget", "description": "Large", "price": 2.0},
+    {"id": 3, "name": "Blue gadget", "description": "Widgetless", "price": 3.0},
+    {"id": "sku-9", "name": "Spare part", "description": "For the blue widget", "price": 4.0},
+]
+
+
+def ids(result):
+    products, _ = result
+    return [product["id"] for product in products]
+
+
+def make_index(products=PRODUCTS):
+    index = ProductIndex()
+    index.build(products)
+    return index
+
+
+def test_matches_word_prefixes_case_insensitively():
+    index = make_index()
+    assert ids(index.search("WIDG")) == [1, 2, 3, "sku-9"]
+    assert ids(index.search("gad")) == [3]
+    assert ids(index.search("nothing")) == []
+
+
+def test_every_term_must_match():
+    index = make_index()
+    assert ids(index.search("blue wid")) == [1, 3, "sku-9"]
+    assert ids(index.search("red blue")) == []
+
+
+def test_empty_query_lists_everything_with_numeric_ids_first():
+    assert ids(make_index().search("")) == [1, 2, 3, "sku-9"]
+
+
+def test_pages_report_the_next_offset():
+    index = make_index()
+    assert index.search("widget", 0, 2) == ([PRODUCTS[0], PRODUCTS[1]], 2)
+    assert index.search("widget", 2, 2) == ([PRODUCTS[2], PRODUCTS[3]], None)
+
+
+def test_upsert_and_remove_are_searchable():
+    index = make_index()
+    index.upsert({"id": 2, "name": "Green widget"})
+    assert ids(index.search("red")) == []
+    assert index.search("green")[0] == [{**PRODUCTS[1], "name": "Green widget"}]
+
+    index.remove(1)
+    assert ids(index.search("blue")) == [3, "sku-9"]
+    assert index.stats()["products"] == 3
+
+
+def test_sync_reindexes_only_what_changed():
+    catalogue = PRODUCTS + [{"id": 10 + n, "name": f"Filler {n}", "description": "", "price": 1.0} for n in range(6)]
+    index = make_index(catalogue)
+    reloaded = [dict(product) for product in catalogue[1:]] + [{"id": 5, "name": "New gizmo", "description": ""}]
+    reloaded[0]["name"] = "Crimson widget"
+
+    assert index.sync(reloaded) == 3
+    fresh = make_index(reloaded)
+    for query in ("", "widget", "blue", "crimson", "red", "giz", "filler"):
+        assert index.search(query) == fresh.search(query)
+    assert index.sync([dict(product) for product in reloaded]) == 0
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from sender import BULK, INTERACTIVE, SendScheduler
+
+
+class Telegram:
+    """
+    Records delivered messages. The first send blocks until `release` is set, so that
+    later messages queue up behind it.
+    """
+
+    def __init__(self, fail_first=None):
+        self.fail_first = fail_first
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.sent = []
+        self.done = threading.Condition()
+
+    def __call__(self, chat_id, text, **kwargs):
+        if not self.started.is_set():
+            self.started.set()
+            self.release.wait(5)
+            if self.fail_first is not None:
+                raise self.fail_first
+        with self.done:
+            self.sent.append((chat_id, text, kwargs, time.monotonic()))
+            self.done.notify_all()
+
+    def wait_for(self, count):
+        with self.done:
+            assert self.done.wait_for(lambda: len(self.sent) >= count, timeout=5)
+
+
+def rate_limited(retry_after):
+    return ApiTelegramException("sendMessage", None, {
+        "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": retry_after}})
+
+
+def test_coalesces_consecutive_messages_to_a_chat():
+    telegram = Telegram()
+    scheduler = SendScheduler(telegram, workers=1)
+    scheduler.submit(1, "first")
+    assert telegram.started.wait(5)
+    scheduler.submit(1, "second")
+    scheduler.submit(1, "third")
+    telegram.release.set()
+
+    telegram.wait_for(2)
+    assert [text for _, text, _, _ in telegram.sent] == ["first", "second\n\nthird"]
+    assert scheduler.stats()["coalesced"] == 1
+
+
+def test_does_not_merge_past_a_keyboard_or_different_options():
+    telegram = Telegram()
+    scheduler = SendScheduler(telegram, chat_burst=10, workers=1)
+    scheduler.submit(1, "blocker")
+    assert telegram.started.wait(5)
+    scheduler.submit(1, "menu", reply_markup="keyboard")
+    scheduler.submit(1, "plain")
+    scheduler.submit(1, "bold", parse_mode="Markdown")
+    telegram.release.set()
+
+    telegram.wait_for(4)
+    assert [text for _, text, _, _ in telegram.sent] == ["blocker", "menu", "plain", "bold"]
+    assert scheduler.stats()["coalesced"] == 0
+
+
+def test_interactive_messages_go_before_bulk():
+    telegram = Telegram()
+    scheduler = SendScheduler(telegram, workers=1)
+    scheduler.submit(1, "blocker")
+    assert telegram.started.wait(5)
+    scheduler.submit(2, "import progress", BULK)
+    scheduler.submit(3, "reply", INTERACTIVE)
+    telegram.release.set()
+
+    telegram.wait_for(3)
+    assert [chat_id for chat_id, _, _, _ in telegram.sent] == [1, 3, 2]
+
+
+def test_rate_limit_pauses_and_resends_the_message():
+    telegram = Telegram(fail_first=rate_limited(0.2))
+    scheduler = SendScheduler(telegram, workers=1)
+    scheduler.submit(1, "hello")
+    assert telegram.started.wait(5)
+    failed_at = time.monotonic()
+    telegram.release.set()
+
+    telegram.wait_for(1)
+    chat_id, text, _, sent_at = telegram.sent[0]
+    assert (chat_id, text) == (1, "hello")
+    assert sent_at - failed_at >= 0.15
+    stats = scheduler.stats()
+    assert (stats["rate_limited"], stats["sent"], stats["failed"]) == (1, 1, 0)
+
+
+def test_call_returns_the_result_after_a_rate_limit():
+    attempts = []
+
+    def edit(text, chat_id, message_id):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limited(0.2)
+        return f"edited {message_id}"
+
+    scheduler = SendScheduler(Telegram(), workers=1)
+    future = scheduler.call(1, edit, "page 2", 1, 7)
+    assert future.result(5) == "edited 7"
+    assert attempts[1] - attempts[0] >= 0.15
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_call_errors_go_to_the_caller_and_are_not_merged():
+    telegram = Telegram()
+    scheduler = SendScheduler(telegram, chat_burst=10, workers=1)
+
+    def edit(text, chat_id, message_id):
+        raise ValueError("message is not modified")
+
+    scheduler.submit(1, "blocker")
+    assert telegram.started.wait(5)
+    scheduler.submit(1, "before")
+    future = scheduler.call(1, edit, "same text", 1, 7)
+    scheduler.submit(1, "after")
+    telegram.release.set()
+
+    with pytest.raises(ValueError):
+        future.result(5)
+    telegram.wait_for(3)
+    assert [text for _, text, _, _ in telegram.sent] == ["blocker", "before", "after"]
@@ -0,0 +1,31 @@
+from views import escape_markdown, slice_page
+
+ITEMS = list(range(30))
+
+
+def test_first_page_of_a_paged_response():
+    assert slice_page(ITEMS[0:11], 0, 10) == (ITEMS[0:10], True)
+
+
+def test_last_page_of_a_paged_response():
+    assert slice_page(ITEMS[20:30], 20, 10, paged=True) == (ITEMS[20:30], False)
+
+
+def test_whole_list_is_sliced_locally():
+    assert slice_page(ITEMS, 10, 10) == (ITEMS[10:20], True)
+    assert slice_page(ITEMS, 20, 10) == (ITEMS[20:30], False)
+
+
+def test_whole_list_of_exactly_limit_plus_one_items():
+    items = list(range(11))
+    assert slice_page(items, 0, 10) == (items[:10], True)
+    assert slice_page(items, 10, 10, paged=False) == ([10], False)
+
+
+def test_short_list_fits_one_page():
+    assert slice_page([1, 2, 3], 0, 10) == ([1, 2, 3], False)
+
+
+def test_escape_markdown_escapes_legacy_markdown_only():
+    assert escape_markdown("fine_thing *v1.0* [x] `y`") == r"fine\_thing \*v1.0\* \[x] \`y\`"
+    assert escape_markdown("Widget v1.0 (blue)!") == "Widget v1.0 (blue)!"
@@ -0,0 +1,251 @@
+import os
+import re
+import telebot
+
+# Number of items shown per page; keeps every message well below Telegram's
+# 4096-character limit regardless of how large the catalogue grows.
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 10))
+
+# Long descriptions are cut so that a single item cannot blow the message limit.
+MAX_FIELD_LENGTH = 200
+
+# Listings are sent with the legacy parse_mode="Markdown", which only recognises these
+# characters and only accepts a backslash escape in front of them.
+_MARKDOWN_SPECIAL = re.compile(r"([_*`\[])")
+
+
+def escape_markdown(text):
+    """
+    Escapes user-supplied text for parse_mode="Markdown" (not MarkdownV2).
+    """
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def _field(value):
+    text = str(value)
+    if len(text) > MAX_FIELD_LENGTH:
+        text = text[:MAX_FIELD_LENGTH - 1] + "…"
+    return escape_markdown(text)
+
+
+def slice_page(items, offset, limit, paged=None):
+    """
+    Interprets a listing fetched with offset and limit + 1. One extra item is requested
+    to learn whether a next page exists; a backend that ignores the parameters returns
+    the whole list, which is then sliced locally.
+    :param paged: Whether the backend honoured offset and limit. If None, it is assumed
+                  to have done so unless more than limit + 1 items came back, which is
+                  ambiguous past the first page when the whole list has at most limit + 1 items.
+    :return: Tuple of (items on the page, whether more items follow).
+    """
+    if paged is None:
+        paged = len(items) <= limit + 1
+    if not paged:
+        return items[offset:offset + limit], offset + limit < len(items)
+    return items[:limit], len(items) > limit
+
+
+def render_product(product):
+    return (
+        f"- ID: {product['id']}\n"
+        f"  Name: {_field(product['name'])}\n"
+        f"  Description: {_field(product['description'])}\n"
+        f"  Price: {product['price']}\n"
+    )
+
+
+def render_products_page(products, offset, total=None):
+    """
+    Renders one page of the product catalogue.
+    :param products: The products on this page.
+    :param offset: Index of the first product on this page within the catalogue.
+    :param total: Total number of products, if known.
+    :return: Message text ready to be sent with parse_mode="Markdown".
+    """
+    if not products:
+        return "📦 **All Products**:\n\nNo products found."
+    last = offset + len(products)
+    counter = f"{offset + 1}-{last} of {total}" if total is not None else f"{offset + 1}-{last}"
+    header = f"📦 **All Products** ({counter}):\n\n"
+    return header + "\n".join(render_product(product) for product in products)
+
+
+def render_order(order):
+    return (
+        f"- Order ID: {order['id']}\n"
+        f"  Product ID: {order['product_id']}\n"
+        f"  Quantity: {order['quantity']}\n"
+        f"  Order Date: {order['order_date']}\n"
+    )
+
+
+def render_order_stats(snapshot, names=None):
+    """
+    Renders the sales aggregates of analytics.OrderAnalytics.snapshot().
+    :param names: Optional mapping of product id to product name.
+    """
+    names = names or {}
+    lines = [
+        "📊 **Order Stats**\n",
+        f"Orders: {snapshot['orders']}  Units: {snapshot['units']}  "
+        f"Products: {snapshot['products']}  Customers: {snapshot['users']}\n",
+        "\n**Daily totals**:\n",
+    ]
+    lines += [f"- {day}: {orders} orders, {units} units\n" for day, orders, units in snapshot["days"]]
+    lines.append("\n**Top products by units sold**:\n")
+    for product_id, units in snapshot["top_products"]:
+        name = names.get(product_id)
+        label = f"{product_id} ({_field(name)})" if name else f"{product_id}"
+        lines.append(f"- {label}: {units}\n")
+    lines.append("\n**Top customers by orders**:\n")
+    lines += [f"- {user_id}: {count}\n" for user_id, count in snapshot["top_users"]]
+    return "".join(lines)
+
+
+def inline_product_result(product):
+    """
+    Builds the inline-query result for a product; choosing it posts the product's details.
+    """
+    description = str(product.get("description", ""))
+    if len(description) > MAX_FIELD_LENGTH:
+        description = description[:MAX_FIELD_LENGTH - 1] + "…"
+    return telebot.types.InlineQueryResultArticle(
+        id=str(product["id"])[:64],
+        title=str(product["name"])[:MAX_FIELD_LENGTH],
+        description=f"{product['price']} · {description}",
+        input_message_content=telebot.types.InputTextMessageContent(render_product(product), parse_mode="Markdown"),
+    )
+
+
+def render_orders_page(orders, offset, title="All Orders"):
+    """
+    Renders one page of an order listing.
+    :param orders: The orders on this page.
+    :param offset: Index of the first order on this page within the listing.
+    :return: Message text ready to be sent with parse_mode="Markdown".
+    """
+    header = f"📋 **{title}** ({offset + 1}-{offset + len(orders)}):\n\n"
+    return header + "\n".join(render_order(order) for order in orders)
+
+
+def pagination_keyboard(kind, offset, page_size, has_more):
+    """
+    Builds Prev/Next buttons whose callback_data carries the offset of the target page,
+    e.g. 'page:products:20'.
+    :param kind: Listing the buttons belong to (e.g. 'products').
+    :return: InlineKeyboardMarkup, or None if there is only one page.
+    """
+    buttons = []
+    if offset > 0:
+        buttons.append(telebot.types.InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f"page:{kind}:{max(0, offset - page_size)}"))
+    if has_more:
+        buttons.append(telebot.types.InlineKeyboardButton(
+            "Next ➡️", callback_data=f"page:{kind}:{offset + page_size}"))
+    if not buttons:
+        return None
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    keyboard.row(*buttons)
+    return keyboard
+
+
+def render_help(role):
+    help_text = (
+        f"🛠️ **Bot Commands for {role}**:\n\n"
+        "/start - Initialize your account or reset your role.\n"
+        "/help - Show this help message.\n"
+        "/info - Get information about this bot.\n\n"
+        "🎛️ **Menu Options**:\n"
+        "1. **View All Products** - View all products stored in the database.\n"
+    )
+    if role in ["Admin", "Moderator"]:
+        help_text += (
+            "2. **Add New Product** - Add a new product to the database.\n"
+            "3. **Update Product** - Update an existing product's details.\n"
+        )
+    if role == "Admin":
+        help_text += "4. **Delete Product** - Remove a product from the database.\n"
+    if role in ["User", "Moderator", "Admin"]:
+        help_text += (
+            "5. **Place an Order** - Place an order for a product.\n"
+            "6. **View My Orders** - Check your order history.\n"
+        )
+    if role == "Admin":
+        help_text += "7. **Order Stats** - Units sold per product, orders per customer and daily totals.\n"
+    return help_text
+
+
+# Shown instead of a generic error while a backend circuit breaker is open.
+BACKEND_UNAVAILABLE_TEXT = "⚠️ The database is temporarily unavailable. Please try again in a minute."
+# Appended to a write's acknowledgement when it was queued while the backend is down.
+QUEUED_NOTICE = "\n⏳ The database is unreachable right now; this will be submitted as soon as it is back."
+# Prefixed to listings served from the last known good copy while the backend is unreachable.
+STALE_NOTICE = "⚠️ _The database is unreachable; showing the last known data._\n\n"
+
+INFO_TEXT = (
+    "🤖 **Bot Information**:\n\n"
+    "This bot is designed to help you manage your database efficiently through an interactive Telegram interface. "
+    "You can perform actions such as viewing products, placing orders, and managing data based on your role.\n\n"
+    "🔑 **Role-Based Features**:\n"
+    "- **Admin**: Full control of products and orders.\n"
+    "- **Moderator**: Limited management capabilities.\n"
+    "- **User**: Place orders and view products.\n\n"
+    "📡 **Powered By**:\n"
+    "- Flask Framework\n"
+    "- Telebot Library\n"
+    "- RESTful API for data operations\n\n"
+    "💡 **Developer**:\n"
+    "Created by [Your Name]. For queries or issues, contact: [Your Contact Info]."
+)
+
+
+class FrozenMarkup(telebot.types.JsonSerializable):
+    """
+    Immutable reply markup whose JSON encoding is computed once and reused on every send.
+    :param markup: The markup to freeze.
+    """
+
+    __slots__ = ("_json",)
+
+    def __init__(self, markup):
+        self._json = markup.to_json()
+
+    def to_json(self):
+        return self._json
+
+
+# Button rows of the main menu for each role, as (label, callback_data) pairs.
+MENU_LAYOUTS = {
+    "admin": (
+        (("View All Products", "view_all_products"), ("Add New Product", "add_new_product"),
+         ("Update Product", "update_product"), ("Delete Product", "delete_product")),
+        (("View All Orders", "view_all_orders"), ("Delete Orders", "delete_orders")),
+        (("📊 Order Stats", "order_stats"),),
+    ),
+    "moderator": (
+        (("View All Products", "view_all_products"), ("Add New Product", "add_new_product"),
+         ("Update Product", "update_product")),
+        (("View All Orders", "view_all_orders"),),
+    ),
+    "user": (
+        (("View All Products", "view_all_products"),),
+        (("Place an Order", "place_order"), ("View My Orders", "view_all_ordersByUser")),
+    ),
+}
+
+# Common options for all roles
+COMMON_MENU_ROW = (("Start", "start"), ("Help", "help"), ("Info", "info"))
+
+
+def build_menu(rows):
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    for row in rows:
+        keyboard.add(*(telebot.types.InlineKeyboardButton(label, callback_data=data) for label, data in row))
+    return keyboard
+
+
+# Built and serialised once at import; keyed by lower-case role name.
+MAIN_MENUS = {
+    role: FrozenMarkup(build_menu(rows + (COMMON_MENU_ROW,)))
+    for role, rows in MENU_LAYOUTS.items()
+}